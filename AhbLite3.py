@@ -1,10 +1,14 @@
 import random
+from collections import deque
 
-import cocotb
 from cocotb.result import TestFailure
-from cocotb.triggers import RisingEdge, Edge
+from cocotb.triggers import RisingEdge, Edge, Event
 
-from cocotblib.misc import log2Up, BoolRandomizer, assertEquals
+from cocotblib.Burst import burstSequence, burstFitBoundary, AhbLite3Burst, BURST_INCR, ONE_KIB
+from cocotblib.ClockDomain import RESET_ACTIVE_LEVEL
+from cocotblib.Coverage import CoverGroup, CoverPoint
+from cocotblib.Phase import forkIn
+from cocotblib.misc import log2Up, BoolRandomizer, assertEquals, rawSignal, WriteCache
 
 
 def AhbLite3MasterIdle(ahb):
@@ -34,6 +38,14 @@ class AhbLite3TraficGenerator:
     def __init__(self,addressWidth,dataWidth):
         self.addressWidth = addressWidth
         self.dataWidth = dataWidth
+        self.coverage = None
+        self.coverageBias = 0.0
+
+    # Draw the burst shape from the coverage holes with the probability bias
+    def setCoverage(self, coverage, bias=0.5):
+        self.coverage = coverage
+        self.coverageBias = bias
+
     def genRandomAddress(self):
         return random.randint(0,(1 << self.addressWidth)-1)
 
@@ -42,44 +54,47 @@ class AhbLite3TraficGenerator:
             trans = AhbLite3Transaction()
             return [trans]
         else:
-            OneKiB = 1 << 10 # this pesky 1 KiB wall a burst must not cross
             hSize = random.randint(0,log2Up(self.dataWidth//8))
-            bytesPerBeat = 1 << hSize
             maxBurst = 5 if hSize == 7 else 7 # a full-width 1024 bit bus can only burst up to 8 beats for not crossing a 1 KiB boundary
             burst = random.randint(0,maxBurst)
+            busy = None # None => random BUSY cycles, 0 => none, 1 => at least one
+            if self.coverage != None and random.random() < self.coverageBias:
+                hole = self.coverage.pickHole()
+                if hole != None:
+                    burst, hSize, busy = hole
+            bytesPerBeat = 1 << hSize
             write = random.random() < 0.5
             prot = random.randint(0,15)
             address = self.genRandomAddress() & ~(bytesPerBeat-1)
 
-            incrUnspecified = burst == 1
-            incrFixed = burst != 1 and burst & 1 == 1
-            wrapFixed = burst & 1 == 0
-
-            if incrUnspecified:
-                maxBeats = (OneKiB - (address % OneKiB)) // bytesPerBeat
-                burstBeats = random.randint(1,maxBeats)
-            else:
-                burstCase = burst >> 1
-                burstBeats = [1,4,8,16][burstCase]
-
-            burstBytes = bytesPerBeat*burstBeats
+            kind, burstBeats = AhbLite3Burst(burst)
+            if burstBeats == None:
+                maxBeats = (ONE_KIB - (address % ONE_KIB)) // bytesPerBeat
+                if busy == 1 and maxBeats == 1:
+                    address -= bytesPerBeat
+                    maxBeats = 2
+                burstBeats = random.randint(2 if busy == 1 else 1,maxBeats)
 
-            while incrFixed and ((address % OneKiB) + burstBytes) > OneKiB:
-                address = address - bytesPerBeat
+            if kind == BURST_INCR:
+                address = burstFitBoundary(address, bytesPerBeat*burstBeats, ONE_KIB)
 
-            addressBase = address - address % burstBytes # for wrapFixed bursts
+            addresses, lanes = burstSequence(address, burstBeats-1, hSize, kind, self.dataWidth)
 
+            busyBeatForced = random.randint(1, burstBeats-1) if busy == 1 else None
             buffer = []
             for beat in range(burstBeats):
-                if beat > 0:
+                if beat > 0 and busy != 0:
                     busyProp = random.random() - 0.8
-                    for busyBeat in range(int(busyProp/0.05)):
+                    busyCount = int(busyProp/0.05)
+                    if beat == busyBeatForced:
+                        busyCount = max(busyCount, 1)
+                    for busyBeat in range(busyCount):
                         trans = AhbLite3Transaction()
                         trans.HWRITE = write
                         trans.HSIZE = hSize
                         trans.HBURST = burst
                         trans.HPROT = prot
-                        trans.HADDR = address
+                        trans.HADDR = addresses[beat]
                         trans.HTRANS = 1 # BUSY
                         trans.HWDATA = random.randint(0,(1 << self.dataWidth)-1)
                         buffer.append(trans)
@@ -88,171 +103,417 @@ class AhbLite3TraficGenerator:
                 trans.HSIZE = hSize
                 trans.HBURST = burst
                 trans.HPROT = prot
-                trans.HADDR = address
+                trans.HADDR = addresses[beat]
                 trans.HTRANS = 2 if beat == 0 else 3 # first beat is NONSEQ, others are SEQ
                 trans.HWDATA = random.randint(0,(1 << self.dataWidth)-1)
-                address += bytesPerBeat
-                if wrapFixed and (address == addressBase + burstBytes):
-                    address = addressBase
                 buffer.append(trans)
             return buffer
 
 class AhbLite3MasterDriver:
-    def __init__(self,ahb,transactor,clk,reset):
+    def __init__(self,ahb,transactor,clk,reset,parent=None):
         self.ahb = ahb
         self.clk = clk
         self.reset = reset
         self.transactor = transactor
-        cocotb.fork(self.stim())
+        self.writeCache = WriteCache()
+        forkIn(parent, self.stim)
 
-    @cocotb.coroutine
-    def stim(self):
+    async def stim(self):
         ahb = self.ahb
-        ahb.HADDR     <= 0
-        ahb.HWRITE    <= 0
-        ahb.HSIZE     <= 0
-        ahb.HBURST    <= 0
-        ahb.HPROT     <= 0
-        ahb.HTRANS    <= 0
-        ahb.HMASTLOCK <= 0
-        ahb.HWDATA    <= 0
+        cache = self.writeCache
+        cache.write(ahb.HADDR, 0)
+        cache.write(ahb.HWRITE, 0)
+        cache.write(ahb.HSIZE, 0)
+        cache.write(ahb.HBURST, 0)
+        cache.write(ahb.HPROT, 0)
+        cache.write(ahb.HTRANS, 0)
+        cache.write(ahb.HMASTLOCK, 0)
+        cache.write(ahb.HWDATA, 0)
+        cache.flush()
+        HREADY = rawSignal(ahb.HREADY)
         HWDATAbuffer = 0
         while True:
             for trans in self.transactor.getTransactions():
-                yield RisingEdge(self.clk)
-                while int(self.ahb.HREADY) == 0:
-                    yield RisingEdge(self.clk)
-
-                ahb.HADDR <= trans.HADDR
-                ahb.HWRITE <= trans.HWRITE
-                ahb.HSIZE <= trans.HSIZE
-                ahb.HBURST <= trans.HBURST
-                ahb.HPROT <= trans.HPROT
-                ahb.HTRANS <= trans.HTRANS
-                ahb.HMASTLOCK <= trans.HMASTLOCK
-                ahb.HWDATA <= HWDATAbuffer
+                await RisingEdge(self.clk)
+                while HREADY.read() == 0:
+                    await RisingEdge(self.clk)
+
+                cache.write(ahb.HADDR, trans.HADDR)
+                cache.write(ahb.HWRITE, trans.HWRITE)
+                cache.write(ahb.HSIZE, trans.HSIZE)
+                cache.write(ahb.HBURST, trans.HBURST)
+                cache.write(ahb.HPROT, trans.HPROT)
+                cache.write(ahb.HTRANS, trans.HTRANS)
+                cache.write(ahb.HMASTLOCK, trans.HMASTLOCK)
+                cache.write(ahb.HWDATA, HWDATAbuffer)
+                cache.flush()
                 HWDATAbuffer = trans.HWDATA
 
+
+# One access queued in AhbLite3Master, buffer hold the write data / receive the read data
+class AhbLite3Request:
+    def __init__(self, address, write, size, buffer):
+        self.address = address
+        self.write = write
+        self.size = size
+        self.buffer = buffer
+        self.pendingBursts = 0
+        self.error = False
+        self.errorAddress = None # Of the first beat with an ERROR response
+        self.dropped = False
+        self.done = Event()
+
+    # Return the buffer once the last data phase is done, raise on an ERROR response or if a reset dropped it
+    async def wait(self):
+        if not self.done.is_set():
+            await self.done.wait()
+        kind = "write" if self.write else "read"
+        if self.dropped:
+            raise TestFailure("AHB %s of %d bytes at 0x%x dropped by the reset" % (kind, len(self.buffer), self.address))
+        if self.error:
+            raise TestFailure("AHB %s ERROR response at 0x%x (access of %d bytes at 0x%x)" % (kind, self.errorAddress, len(self.buffer), self.address))
+        return self.buffer
+
+
+# SINGLE transfer or INCR burst of a request, which can't cross a 1 KiB boundary
+class AhbLite3MasterBurst:
+    def __init__(self, request, offset, beats):
+        self.request = request
+        self.address = request.address + offset
+        self.offset = offset
+        self.beats = beats
+        self.hburst = 0 if beats == 1 else {4 : 3, 8 : 5, 16 : 7}.get(beats, 1) # SINGLE, INCR4/8/16 or INCR
+
+
+###############################################################################
+# Transaction level AHB-Lite master
+#
+# Usage :
+#
+#    master = AhbLite3Master(ahb, dut.clk, dut.reset, resetActiveLevel=RESET_ACTIVE_LEVEL.HIGH)
+#    await master.write(0x1000, 0xCAFE, size=2)
+#    value = await master.read(0x1000, size=2)
+#    await master.writeBurst(0x2000, firmware)         # bytes-like, INCR bursts split at the 1 KiB boundaries
+#    data = await master.readBurst(0x2000, 4096)       # bytearray
+#
+#    requests = [master.queueWrite(0x100 + i*4, i) for i in range(64)]  # Issued back to back without waiting
+#    for request in requests:
+#        await request.wait()
+#
+# All the requests go into one queue, executed in order by one coroutine which keep the address and data
+# phases pipelined, so a burst or a sequence of queued requests runs at one beat per HREADY cycle.
+# Each queue call return one request covering all its bursts, its wait() raise if any of them got an ERROR response.
+# An awaited call completes on its last data phase, so the next call start one cycle later, queue them to avoid it.
+# size is the log2 of the bytes per beat (HSIZE), the full bus width by default, addresses must be aligned on it.
+# While the reset is active, HTRANS is IDLE and the in flight and queued requests are dropped (their wait() raise).
+#
+class AhbLite3Master:
+    def __init__(self,ahb,clk,reset,parent=None,resetActiveLevel=RESET_ACTIVE_LEVEL.DEFAULT):
+        self.ahb = ahb
+        self.clk = clk
+        self.reset = reset
+        self.resetActiveLevel = resetActiveLevel
+        self.wordBytes = len(ahb.HWDATA) // 8
+        self.defaultSize = log2Up(self.wordBytes)
+        self.hprot = 3 # Data access, privileged
+        self.bursts = deque()
+        self.workEvent = Event()
+        self.writeCache = WriteCache()
+        self.beatCounter = 0
+        forkIn(parent, self.stim)
+
+    def _queue(self, address, write, size, buffer):
+        size = self.defaultSize if size == None else size
+        bytesPerBeat = 1 << size
+        if bytesPerBeat > self.wordBytes:
+            raise Exception("AHB size %d wider than the %d bits bus" % (size, self.wordBytes*8))
+        if len(buffer) == 0:
+            raise Exception("Empty AHB access")
+        if address % bytesPerBeat != 0 or len(buffer) % bytesPerBeat != 0:
+            raise Exception("AHB access of %d bytes at 0x%x not aligned on %d bytes" % (len(buffer), address, bytesPerBeat))
+        request = AhbLite3Request(address, write, size, buffer)
+        offset = 0
+        while offset != len(buffer):
+            byteCount = min(len(buffer) - offset, ONE_KIB - (address + offset) % ONE_KIB)
+            self.bursts.append(AhbLite3MasterBurst(request, offset, byteCount // bytesPerBeat))
+            request.pendingBursts += 1
+            offset += byteCount
+        self.workEvent.set()
+        return request
+
+    def queueWrite(self, address, data, size=None):
+        size = self.defaultSize if size == None else size
+        if isinstance(data, int):
+            data = data.to_bytes(1 << size, "little")
+        return self._queue(address, True, size, memoryview(data).cast("B"))
+
+    def queueRead(self, address, byteCount=None, size=None, buffer=None):
+        size = self.defaultSize if size == None else size
+        if buffer == None:
+            buffer = bytearray(byteCount if byteCount != None else 1 << size)
+        return self._queue(address, False, size, memoryview(buffer).cast("B"))
+
+    async def write(self, address, data, size=None):
+        await self.queueWrite(address, data, size).wait()
+
+    async def read(self, address, size=None):
+        return int.from_bytes(await self.queueRead(address, size=size).wait(), "little")
+
+    async def writeBurst(self, address, data, size=None):
+        await self.queueWrite(address, data, size).wait()
+
+    async def readBurst(self, address, byteCount, size=None):
+        buffer = bytearray(byteCount)
+        await self.queueRead(address, size=size, buffer=buffer).wait()
+        return buffer
+
+    # Complete the given bursts requests and the queued ones as dropped
+    def _drop(self, *bursts):
+        for burst in list(bursts) + list(self.bursts):
+            if burst != None and not burst.request.done.is_set():
+                burst.request.dropped = True
+                burst.request.done.set()
+        self.bursts.clear()
+
+    async def stim(self):
+        ahb = self.ahb
+        cache = self.writeCache
+        HREADY = rawSignal(ahb.HREADY)
+        HRDATA = rawSignal(ahb.HRDATA)
+        HRESP  = rawSignal(ahb.HRESP)
+        reset = rawSignal(self.reset) if self.reset != None else None
+        wordBytes = self.wordBytes
+        bursts = self.bursts
+        cache.write(ahb.HTRANS, 0)
+        cache.write(ahb.HMASTLOCK, 0)
+        cache.write(ahb.HWDATA, 0)
+        cache.flush()
+        address = None # (burst, beat) in the address phase
+        data = None    # (burst, beat) in the data phase
+        while True:
+            await RisingEdge(self.clk)
+            if reset != None and reset.read() == self.resetActiveLevel:
+                self._drop(address and address[0], data and data[0])
+                address = data = None
+                cache.write(ahb.HTRANS, 0)
+                cache.flush()
+                continue
+            if HREADY.read() == 0:
+                continue
+
+            if data != None:
+                burst, beat = data
+                request = burst.request
+                bytesPerBeat = 1 << request.size
+                offset = burst.offset + beat * bytesPerBeat
+                if HRESP.read() == 1 and not request.error:
+                    request.error = True
+                    request.errorAddress = request.address + offset
+                if not request.write:
+                    lane = (request.address + offset) % wordBytes
+                    value = (HRDATA.read() >> (lane*8)) & ((1 << bytesPerBeat*8)-1)
+                    request.buffer[offset:offset + bytesPerBeat] = value.to_bytes(bytesPerBeat, "little")
+                self.beatCounter += 1
+                if beat == burst.beats-1:
+                    request.pendingBursts -= 1
+                    if request.pendingBursts == 0:
+                        request.done.set()
+
+            data = address
+            if data != None:
+                burst, beat = data
+                request = burst.request
+                if request.write:
+                    bytesPerBeat = 1 << request.size
+                    offset = burst.offset + beat * bytesPerBeat
+                    lane = (request.address + offset) % wordBytes
+                    cache.write(ahb.HWDATA, int.from_bytes(request.buffer[offset:offset + bytesPerBeat], "little") << (lane*8))
+
+            if address != None and address[1] != address[0].beats-1:
+                address = (address[0], address[1] + 1)
+            elif len(bursts) != 0:
+                address = (bursts.popleft(), 0)
+            else:
+                address = None
+
+            if address != None:
+                burst, beat = address
+                request = burst.request
+                cache.write(ahb.HADDR, burst.address + (beat << request.size))
+                cache.write(ahb.HWRITE, request.write)
+                cache.write(ahb.HSIZE, request.size)
+                cache.write(ahb.HBURST, burst.hburst)
+                cache.write(ahb.HPROT, self.hprot)
+                cache.write(ahb.HTRANS, 2 if beat == 0 else 3) # NONSEQ, SEQ
+            else:
+                cache.write(ahb.HTRANS, 0)
+            cache.flush()
+
+            if address == None and data == None:
+                # Idle, sleep until something is queued
+                if len(bursts) == 0:
+                    self.workEvent.clear()
+                    await self.workEvent.wait()
+
 class AhbLite3Terminaison:
-    def __init__(self,ahb,clk,reset):
+    def __init__(self,ahb,clk,reset,parent=None):
         self.ahb = ahb
         self.clk = clk
         self.reset = reset
         self.randomHREADY = True
-        cocotb.fork(self.stim())
-        cocotb.fork(self.combEvent())
+        self.rawHREADYOUT = rawSignal(ahb.HREADYOUT)
+        forkIn(parent, self.stim)
+        forkIn(parent, self.combEvent)
 
-    @cocotb.coroutine
-    def stim(self):
+    async def stim(self):
         randomizer = BoolRandomizer()
         self.ahb.HREADY <= 1
         self.ahb.HSEL <= 1
         while True:
-            yield RisingEdge(self.clk)
+            await RisingEdge(self.clk)
             self.randomHREADY = randomizer.get()
             self.doComb()
 
-    @cocotb.coroutine
-    def combEvent(self):
+    async def combEvent(self):
         while True:
-            yield Edge(self.ahb.HREADYOUT)
+            await Edge(self.ahb.HREADYOUT)
             self.doComb()
 
     def doComb(self):
-        self.ahb.HREADY <= (self.randomHREADY and (int(self.ahb.HREADYOUT) == 1))
+        self.ahb.HREADY <= (self.randomHREADY and (self.rawHREADYOUT.read() == 1))
 
 
 class AhbLite3MasterReadChecker:
-    def __init__(self,ahb,buffer,clk,reset):
+    def __init__(self,ahb,buffer,clk,reset,parent=None):
         self.ahb = ahb
         self.clk = clk
         self.reset = reset
         self.buffer = buffer
         self.counter = 0
-        cocotb.fork(self.stim())
+        forkIn(parent, self.stim)
 
-    @cocotb.coroutine
-    def stim(self):
+    async def stim(self):
         ahb = self.ahb
+        HREADY = rawSignal(ahb.HREADY)
+        HRDATA = rawSignal(ahb.HRDATA)
+        HADDR  = rawSignal(ahb.HADDR)
+        HTRANS = rawSignal(ahb.HTRANS)
+        HWRITE = rawSignal(ahb.HWRITE)
+        HSIZE  = rawSignal(ahb.HSIZE)
+        wordBytes = len(ahb.HWDATA) // 8
         readIncoming = False
+        size = 0
+        byteOffset = 0
         while True:
-            yield RisingEdge(self.clk)
-            if int(self.ahb.HREADY) == 1:
+            await RisingEdge(self.clk)
+            if HREADY.read() == 1:
                 if readIncoming:
                     if self.buffer.empty():
                         raise TestFailure("Empty buffer ??? ")
 
                     bufferData = self.buffer.get()
+                    data = HRDATA.read()
                     for i in range(byteOffset,byteOffset + size):
-                        assertEquals((int(ahb.HRDATA) >> (i*8)) & 0xFF,(bufferData >> (i*8)) & 0xFF,"AHB master read checker faild %x "  %(int(ahb.HADDR)) )
+                        assertEquals((data >> (i*8)) & 0xFF,(bufferData >> (i*8)) & 0xFF,"AHB master read checker faild %x "  %(HADDR.read()) )
 
                     self.counter += 1
                     # cocotb.log.info("POP " + str(self.buffer.qsize()))
 
-                readIncoming = int(ahb.HTRANS) >= 2 and int(ahb.HWRITE) == 0
-                size = 1 << int(ahb.HSIZE)
-                byteOffset = int(ahb.HADDR) % (len(ahb.HWDATA) // 8)
+                readIncoming = HTRANS.read() >= 2 and HWRITE.read() == 0
+                size = 1 << HSIZE.read()
+                byteOffset = HADDR.read() % wordBytes
 
 
 
 class AhbLite3SlaveMemory:
-    def __init__(self,ahb,base,size,clk,reset):
+    def __init__(self,ahb,base,size,clk,reset,parent=None):
         self.ahb = ahb
         self.clk = clk
         self.reset = reset
         self.base = base
         self.size = size
         self.ram = bytearray(b'\x00' * size)
+        self.writeCache = WriteCache()
+        self.latency = None # Latency profile (see Latency.py), random wait states when None
 
-        cocotb.fork(self.stim())
-        cocotb.fork(self.stimReady())
+        forkIn(parent, self.stim)
+        forkIn(parent, self.stimReady)
 
-    @cocotb.coroutine
-    def stimReady(self):
+    async def stimReady(self):
         randomizer = BoolRandomizer()
+        HREADY    = rawSignal(self.ahb.HREADY)
+        HREADYOUT = rawSignal(self.ahb.HREADYOUT)
+        HTRANS    = rawSignal(self.ahb.HTRANS)
+        HADDR     = rawSignal(self.ahb.HADDR)
+        HWRITE    = rawSignal(self.ahb.HWRITE)
         self.ahb.HREADYOUT <= 1
         busy = False
+        waits = 0
         while True:
-            yield RisingEdge(self.clk)
-            if int(self.ahb.HREADY) == 1:
-                busyNew = int(self.ahb.HTRANS) >= 2
+            await RisingEdge(self.clk)
+            ready = HREADY.read()
+            if ready == 1:
+                trans = HTRANS.read()
+                busyNew = trans >= 2
             else:
                 busyNew = busy
-            if (busy or busyNew) and int(self.ahb.HREADYOUT) == 0 and int(self.ahb.HREADY) == 1:
+            if (busy or busyNew) and HREADYOUT.read() == 0 and ready == 1:
                 raise TestFailure("HREADYOUT == 0 but HREADY == 1 ??? " + self.ahb.HREADY._name)
             busy = busyNew
-            if (busy):
+            if self.latency != None:
+                # The wait states of a transfer are given once, when its address phase is accepted
+                if ready == 1 and busy:
+                    waits = self.latency.getLatency(HADDR.read() - self.base, HWRITE.read(), trans == 3)
+                elif waits != 0:
+                    waits -= 1
+                self.ahb.HREADYOUT <= (waits == 0)
+            elif (busy):
                 self.ahb.HREADYOUT <= randomizer.get() # make some random delay for NONSEQ and SEQ requests
             else:
                 self.ahb.HREADYOUT <= 1 # IDLE and BUSY require 0 WS
 
-    @cocotb.coroutine
-    def stim(self):
+    async def stim(self):
         ahb = self.ahb
+        cache = self.writeCache
         ahb.HREADYOUT <= 1
-        ahb.HRESP     <= 0
-        ahb.HRDATA    <= 0
+        cache.write(ahb.HRESP, 0)
+        cache.write(ahb.HRDATA, 0)
+        cache.flush()
+        HREADY = rawSignal(ahb.HREADY)
+        HSEL   = rawSignal(ahb.HSEL)
+        HTRANS = rawSignal(ahb.HTRANS)
+        HWRITE = rawSignal(ahb.HWRITE)
+        HSIZE  = rawSignal(ahb.HSIZE)
+        HADDR  = rawSignal(ahb.HADDR)
+        HWDATA = rawSignal(ahb.HWDATA)
+        wordBytes = len(ahb.HWDATA)//8
         valid = 0
+        trans = 0
+        write = 0
+        size = 0
+        address = 0
+        addressOffset = 0
         while True:
-            yield RisingEdge(self.clk)
-            while int(self.ahb.HREADY) == 0:
-                yield RisingEdge(self.clk)
+            await RisingEdge(self.clk)
+            while HREADY.read() == 0:
+                await RisingEdge(self.clk)
 
             if valid == 1:
                 if trans >= 2:
                     if write == 1:
+                        wdata = HWDATA.read()
                         for idx in range(size):
-                            self.ram[address-self.base  + idx] = (int(ahb.HWDATA) >> (8*(addressOffset + idx))) & 0xFF
-                            # print("write %x with %x" % (address + idx,(int(ahb.HWDATA) >> (8*(addressOffset + idx))) & 0xFF))
+                            self.ram[address-self.base  + idx] = (wdata >> (8*(addressOffset + idx))) & 0xFF
+                            # print("write %x with %x" % (address + idx,(wdata >> (8*(addressOffset + idx))) & 0xFF))
 
-            valid = int(ahb.HSEL)
-            trans = int(ahb.HTRANS)
-            write = int(ahb.HWRITE)
-            size = 1 << int(ahb.HSIZE)
-            address = int(ahb.HADDR)
-            addressOffset = address % (len(ahb.HWDATA)//8)
+            valid = HSEL.read()
+            trans = HTRANS.read()
+            write = HWRITE.read()
+            size = 1 << HSIZE.read()
+            address = HADDR.read()
+            addressOffset = address % wordBytes
 
-            ahb.HRDATA <= 0
+            rdata = 0
             if valid == 1:
                 if trans >= 2:
                     if write == 0:
@@ -261,4 +522,46 @@ class AhbLite3SlaveMemory:
                             data |= self.ram[address-self.base + idx] << (8*(addressOffset + idx))
                             # print("read %x with %x" % (address + idx, self.ram[address-self.base + idx]))
                         # print(str(data))
-                        ahb.HRDATA <= int(data)
+                        rdata = data
+            cache.write(ahb.HRDATA, rdata)
+            cache.flush()
+
+
+
+# HBURST x HSIZE x BUSY coverage of the AHB bursts, sampled when each burst end
+class AhbLite3Coverage(CoverGroup):
+    def __init__(self, name, parent, ahb, clk, reset):
+        CoverGroup.__init__(self, name, parent, [
+            CoverPoint("HBURST", 8),
+            CoverPoint("HSIZE", log2Up(len(ahb.HWDATA)//8) + 1),
+            CoverPoint("BUSY", 2)
+        ])
+        # SINGLE transfers have no BUSY cycle, 16 beats of 1024 bits would cross the 1 KiB boundary
+        self.ignore(lambda hburst, hsize, busy: (hburst == 0 and busy == 1) or (hburst >= 6 and hsize == 7))
+        self.ahb = ahb
+        self.clk = clk
+        self.reset = reset
+        self.fork(self.stim)
+
+    async def stim(self):
+        HREADY = rawSignal(self.ahb.HREADY)
+        HTRANS = rawSignal(self.ahb.HTRANS)
+        HBURST = rawSignal(self.ahb.HBURST)
+        HSIZE  = rawSignal(self.ahb.HSIZE)
+        burst = None
+        size = 0
+        busy = 0
+        while True:
+            await RisingEdge(self.clk)
+            if HREADY.read() == 1:
+                trans = HTRANS.read()
+                if trans == 1:
+                    busy = 1
+                elif trans != 3:
+                    if burst != None:
+                        self.sample(burst, size, busy)
+                        burst = None
+                    if trans == 2:
+                        burst = HBURST.read()
+                        size = HSIZE.read()
+                        busy = 0
@@ -1,11 +1,10 @@
 import random
 
 import cocotb
-from cocotb.decorators import coroutine
-from cocotb.result import TestFailure, ReturnValue
+from cocotb.result import TestFailure
 from cocotb.triggers import RisingEdge, Edge
 
-from cocotblib.misc import log2Up, BoolRandomizer, assertEquals, waitClockedCond, randSignal
+from cocotblib.misc import log2Up, BoolRandomizer, assertEquals, waitClockedValue, waitCycles, randBits, WriteCache, retvalCoroutine
 
 
 class Apb3:
@@ -18,70 +17,76 @@ class Apb3:
         self.PWRITE    = dut.__getattr__(name + "_PWRITE")
         self.PWDATA    = dut.__getattr__(name + "_PWDATA")
         self.PRDATA    = dut.__getattr__(name + "_PRDATA")
+        self.writeCache = WriteCache()
 
     def idle(self):
-        self.PSEL <= 0
+        self.writeCache.write(self.PSEL, 0)
+        self.writeCache.flush()
 
-    @coroutine
-    def delay(self, cycle):
-        for i in range(cycle):
-            yield RisingEdge(self.clk)
+    def randSignal(self, that):
+        self.writeCache.write(that, randBits(len(that)))
 
-    @coroutine
-    def write(self, address, data, sel = 1):
-        self.PADDR <= address
-        self.PSEL <= sel
-        self.PENABLE <= False
-        self.PWRITE <= True
-        self.PWDATA <= data
-        yield RisingEdge(self.clk)
-        self.PENABLE <= True
-        yield waitClockedCond(self.clk, lambda : self.PREADY == True)
-        randSignal(self.PADDR)
-        self.PSEL <= 0
-        randSignal(self.PENABLE)
-        randSignal(self.PWRITE)
-        randSignal(self.PWDATA)
+    async def delay(self, cycle):
+        await waitCycles(self.clk, cycle)
 
-    @coroutine
-    def writeMasked(self, address, data, mask, sel = 1):
-        readThread = self.read(address,sel)
-        yield readThread
-        yield self.write(address,(readThread.retval & ~mask) | (data & mask),sel)
+    async def write(self, address, data, sel = 1):
+        cache = self.writeCache
+        cache.write(self.PADDR, address)
+        cache.write(self.PSEL, sel)
+        cache.write(self.PENABLE, 0)
+        cache.write(self.PWRITE, 1)
+        cache.write(self.PWDATA, data)
+        cache.flush()
+        await RisingEdge(self.clk)
+        cache.write(self.PENABLE, 1)
+        cache.flush()
+        await waitClockedValue(self.clk, self.PREADY, 1)
+        self.randSignal(self.PADDR)
+        cache.write(self.PSEL, 0)
+        self.randSignal(self.PENABLE)
+        self.randSignal(self.PWRITE)
+        self.randSignal(self.PWDATA)
+        cache.flush()
 
-    @coroutine
-    def read(self, address, sel=1):
-        self.PADDR <= address
-        self.PSEL <= sel
-        self.PENABLE <= False
-        self.PWRITE <= False
-        randSignal(self.PWDATA)
-        yield RisingEdge(self.clk)
-        self.PENABLE <= True
-        yield waitClockedCond(self.clk, lambda: self.PREADY == True)
-        randSignal(self.PADDR)
-        self.PSEL <= 0
-        randSignal(self.PENABLE)
-        randSignal(self.PWRITE)
-        raise ReturnValue(int(self.PRDATA))
+    async def writeMasked(self, address, data, mask, sel = 1):
+        value = await self.read(address,sel)
+        await self.write(address,(value & ~mask) | (data & mask),sel)
 
+    @retvalCoroutine
+    async def read(self, address, sel=1):
+        cache = self.writeCache
+        cache.write(self.PADDR, address)
+        cache.write(self.PSEL, sel)
+        cache.write(self.PENABLE, 0)
+        cache.write(self.PWRITE, 0)
+        self.randSignal(self.PWDATA)
+        cache.flush()
+        await RisingEdge(self.clk)
+        cache.write(self.PENABLE, 1)
+        cache.flush()
+        await waitClockedValue(self.clk, self.PREADY, 1)
+        self.randSignal(self.PADDR)
+        cache.write(self.PSEL, 0)
+        self.randSignal(self.PENABLE)
+        self.randSignal(self.PWRITE)
+        cache.flush()
+        return int(self.PRDATA)
 
-    @coroutine
-    def readAssert(self, address, data, sel=1):
-        readThread = self.read(address,sel)
-        yield readThread
-        assertEquals(int(readThread.retval), data," APB readAssert failure")
 
-    @coroutine
-    def readAssertMasked(self, address, data, mask, sel=1):
-        readThread = self.read(address,sel)
-        yield readThread
-        assertEquals(int(readThread.retval) & mask, data," APB readAssert failure")
+    async def readAssert(self, address, data, sel=1):
+        value = await self.read(address,sel)
+        assertEquals(value, data," APB readAssert failure")
 
-    @coroutine
-    def pull(self, address, dataValue, dataMask, sel=1):
+    async def readAssertMasked(self, address, data, mask, sel=1):
+        value = await self.read(address,sel)
+        assertEquals(value & mask, data," APB readAssert failure")
+
+    # The delay between two reads double from 1 up to maxDelay cycles
+    async def pull(self, address, dataValue, dataMask, sel=1, maxDelay=64):
+        delay = 1
         while True:
-            readThread = self.read(address, sel)
-            yield readThread
-            if (int(readThread.retval) & dataMask) == dataValue:
-                break
\ No newline at end of file
+            value = await self.read(address, sel)
+            if (value & dataMask) == dataValue:
+                break
+            await waitCycles(self.clk, delay)
+            delay = min(delay*2, maxDelay)
\ No newline at end of file
@@ -1,11 +1,20 @@
 import random
+from array import array
+from collections import deque
 from queue import Queue
 
-from cocotblib.Phase import PHASE_SIM, Infrastructure
+from cocotb.result import TestFailure
+from cocotb.triggers import RisingEdge
+
+from cocotblib.Burst import burstSequence, burstCrossBoundary, burstFitBoundary, BURST_INCR, BURST_WRAP, FOUR_KIB
+from cocotblib.ClockDomain import RESET_ACTIVE_LEVEL
+from cocotblib.Coverage import CoverGroup, CoverPoint, binLog2, randBinLog2
+from cocotblib.Metrics import getMetrics
+from cocotblib.Phase import PHASE_SIM, PHASE_WAIT_TASKS_END, Infrastructure
 from cocotblib.Scorboard import ScorboardOutOfOrder
-from cocotblib.misc import BoolRandomizer, log2Up, randBits
+from cocotblib.misc import BoolRandomizer, log2Up, randBits, rawSignal, WriteCache
 
-from cocotblib.Stream import Stream, Transaction, StreamDriverSlave, StreamDriverMaster, StreamMonitor
+from cocotblib.Stream import Stream, Transaction, StreamDriverSlave, StreamDriverMaster, StreamMonitor, WAIT_WORK
 
 
 class Axi4:
@@ -47,6 +56,58 @@ def Axi4AddrIncr(address,burst,len,size):
         return (address & ~burstMask) | base
 
 
+# Byte strobe to bit mask, 8 strobes at the time
+_strbByteToMask = [sum(0xFF << (i*8) for i in range(8) if (s >> i) & 1) for s in range(256)]
+
+def Axi4StrbToMask(strb, byteCount):
+    mask = 0
+    for i in range(0, byteCount, 8):
+        mask |= _strbByteToMask[(strb >> i) & 0xFF] << (i*8)
+    return mask
+
+
+# Read response reference which only fetch its data from the memory model when the scoreboard compare it.
+# The checker keep the address range reserved until the response is matched, so the memory can't change in between.
+class Axi4ReadRspRef(Transaction):
+    def __init__(self, ram, addrBase, byteCount):
+        Transaction.__init__(self)
+        self._ram = ram
+        self._addrBase = addrBase
+        self._byteCount = byteCount
+
+    def __getattr__(self, name):
+        if name == "data":
+            self.data = int.from_bytes(self._ram[self._addrBase:self._addrBase + self._byteCount], "little")
+            return self.data
+        raise AttributeError(name)
+
+    # Resolved before leaving the memory model (scoreboard spilled to disk)
+    def __getstate__(self):
+        self.data
+        state = dict(self.__dict__)
+        state.pop("_ram")
+        return state
+
+
+
+# burst x size x len coverage of the AXI4 commands
+class Axi4CmdCoverage(CoverGroup):
+    def __init__(self, name, parent, dataWidth, maxLen=255):
+        CoverGroup.__init__(self, name, parent, [
+            CoverPoint("burst", 3),
+            CoverPoint("size", log2Up(dataWidth//8) + 1),
+            CoverPoint("len", binLog2(maxLen) + 1, binLog2)
+        ])
+        # WRAP bursts are 2, 4, 8 or 16 beats long, FIXED ones 1 to 16 beats
+        self.ignore(lambda burst, size, len: burst == 2 and len not in [1, 2, 3, 4])
+        self.ignore(lambda burst, size, len: burst == 0 and len > binLog2(15))
+        # INCR bursts can't cross 4 KiB, the len bins starting above 4 KiB >> size beats are unreachable
+        self.ignore(lambda burst, size, len: burst == 1 and len != 0 and ((1 << (len-1)) + 1) << size > FOUR_KIB)
+
+    def onCmd(self, cmd):
+        self.sample(cmd.burst, cmd.size, cmd.len)
+
+
 
 class Axi4SharedMemoryChecker(Infrastructure):
     def __init__(self,name,parent,axi,addressWidth,clk,reset):
@@ -67,18 +128,33 @@ class Axi4SharedMemoryChecker(Infrastructure):
         self.nonZeroReadRspCounter = 0
         self.nonZeroReadRspCounterTarget = 1000
         self.reservedAddresses = {}
+        self.reservationCounter = 0
         self.dataWidth = len(axi.w.payload.data)
-        StreamDriverSlave(axi.r, clk, reset)
-        StreamDriverSlave(axi.b, clk, reset)
-        StreamDriverMaster(axi.arw, self.genReadWriteCmd, clk, reset)
-        StreamDriverMaster(axi.w, self.genWriteData, clk, reset)
-        StreamMonitor(axi.r, self.onReadRsp, clk, reset)
-        StreamMonitor(axi.b, self.onWriteRsp, clk, reset)
+        self.clk = clk
+        self.reset = reset
+        self.cmdCoverage = None # See enableCoverage
+        self.coverageBias = 0.0 # Probability to draw the burst shape from the cmdCoverage holes
+        StreamDriverSlave(axi.r, clk, reset, parent=self)
+        StreamDriverSlave(axi.b, clk, reset, parent=self)
+        StreamDriverMaster(axi.arw, self.genReadWriteCmd, clk, reset, parent=self)
+        StreamDriverMaster(axi.w, self.genWriteData, clk, reset, parent=self)
+        StreamMonitor(axi.r, self.onReadRsp, clk, reset, parent=self)
+        StreamMonitor(axi.b, self.onWriteRsp, clk, reset, parent=self)
+        getMetrics().addCollector(self.collectProgress)
         axi.w.payload.last <= 0
         axi.r.payload.last <= 0
 
+    # Sample the commands into cmdCoverage, with a goal it hold PHASE_SIM until reached instead of nonZeroReadRspCounterTarget
+    def enableCoverage(self, goal=None, bias=0.0):
+        if self.cmdCoverage == None:
+            self.cmdCoverage = Axi4CmdCoverage("cmdCoverage", self, self.dataWidth, maxLen=63)
+            StreamMonitor(self.axi.arw, self.cmdCoverage.onCmd, self.clk, self.reset, parent=self)
+        self.cmdCoverage.goal = goal
+        self.coverageBias = bias
+        return self.cmdCoverage
+
     def freeReservatedAddresses(self,uut,ref,equal):
-        self.reservedAddresses.pop(ref,None)
+        self.reservedAddresses.pop(getattr(ref, "_reservation", None),None)
 
     def isAddressRangeBusy(self,start,end):
         for r in self.reservedAddresses.values():
@@ -89,6 +165,12 @@ class Axi4SharedMemoryChecker(Infrastructure):
     def genRandomeAddress(self):
         return randBits(self.addressWidth)
 
+    # Reservations are keyed by an id stored in the reference, as the scoreboards can spill the references to disk
+    def reserveAddressRange(self, ref, start, end):
+        self.reservationCounter += 1
+        ref._reservation = self.reservationCounter
+        self.reservedAddresses[ref._reservation] = [start, end]
+
     def genNewCmd(self):
         cmd = Transaction()
         cmd.hid = randBits(self.idWidth)  # Each master can use 4 id
@@ -100,20 +182,31 @@ class Axi4SharedMemoryChecker(Infrastructure):
             cmd.len = random.choice([2,4,8,16])-1
         else:
             cmd.len = randBits(4) + (16 if random.random() < 0.1 else 0) + (32 if random.random() < 0.02 else 0)
+        if self.cmdCoverage != None and self.coverageBias != 0.0 and random.random() < self.coverageBias:
+            hole = self.cmdCoverage.pickHole()
+            if hole != None:
+                cmd.burst, cmd.size, lenBin = hole
+                cmd.len = randBinLog2(lenBin) if cmd.burst != 2 else (1 << lenBin)-1
+        if cmd.burst == 0:
+            cmd.len = min(cmd.len, 15) # FIXED bursts are at most 16 beats
+        if cmd.burst == 1:
+            cmd.len = min(cmd.len, (FOUR_KIB >> cmd.size) - 1) # Else no address could avoid the 4 KiB crossing
         cmd.lock = randBits(1)
         cmd.cache = randBits(4)
         cmd.qos = randBits(4)
         cmd.prot = randBits(3)
 
         byteCount = (1 << cmd.size)*(cmd.len + 1)
-        while(True):
+        wordBytes = self.dataWidth//8
+        # All the address space can be reserved by the in flight commands, give up and retry on a later cycle
+        for attempt in range(256):
             cmd.addr  = self.genRandomeAddress() & ~((1 << cmd.size)-1)
             if cmd.burst == 1:
-                if cmd.addr + byteCount >= (1<<self.addressWidth):
+                if cmd.addr + byteCount >= (1<<self.addressWidth) or burstCrossBoundary(cmd.addr, byteCount, FOUR_KIB):
                     continue
             if cmd.burst == 0:
                 start = cmd.addr
-                end   = start + cmd.size
+                end   = start + (1 << cmd.size)
 
             if cmd.burst == 1:
                 start = cmd.addr
@@ -123,67 +216,75 @@ class Axi4SharedMemoryChecker(Infrastructure):
                 start = cmd.addr & ~(byteCount-1)
                 end = start + byteCount
 
+            # Reserve whole data words, as the read references are only resolved when the response come back
+            start = start & ~(wordBytes-1)
+            end = (end + wordBytes-1) & ~(wordBytes-1)
             if self.isAddressRangeBusy(start,end):
                 continue
             break
+        else:
+            return False
 
         if self.readWriteRand.get():
             cmd.write = 1
-            beatAddr = cmd.addr
+            beatAddrs, _ = burstSequence(cmd.addr, cmd.len, cmd.size, cmd.burst, self.dataWidth)
             for i in range(cmd.len+1):
                 dataTrans = Transaction()
                 dataTrans.data = randBits(self.dataWidth)
-                dataTrans.strb = randBits(self.dataWidth//8)
+                dataTrans.strb = randBits(wordBytes)
                 dataTrans.last = 1 if cmd.len == i else 0
                 self.writeTasks.put(dataTrans)
 
-                for s in range(self.dataWidth//8):
-                    if (dataTrans.strb >> s) & 1 == 1:
-                        self.ram[(beatAddr & ~(self.dataWidth//8-1)) + s] = (dataTrans.data >> (s*8)) & 0xFF
-                beatAddr = Axi4AddrIncr(beatAddr,cmd.burst,cmd.len,cmd.size)
+                addrBase = beatAddrs[i] & ~(wordBytes-1)
+                mask = Axi4StrbToMask(dataTrans.strb, wordBytes)
+                word = int.from_bytes(self.ram[addrBase:addrBase + wordBytes], "little")
+                word = (word & ~mask) | (dataTrans.data & mask)
+                self.ram[addrBase:addrBase + wordBytes] = word.to_bytes(wordBytes, "little")
 
             writeRsp = Transaction()
             writeRsp.resp = 0
             writeRsp.hid = cmd.hid
 
-            self.reservedAddresses[writeRsp] = [start,end]
+            self.reserveAddressRange(writeRsp, start, end)
             self.writeRspScoreboard.refPush(writeRsp,writeRsp.hid)
         else:
             cmd.write = 0
 
-            beatAddr = cmd.addr
+            beatAddrs, _ = burstSequence(cmd.addr, cmd.len, cmd.size, cmd.burst, self.dataWidth)
             for s in range(cmd.len + 1):
-                readRsp = Transaction()
-                addrBase = beatAddr & ~(self.dataWidth//8-1)
-                readRsp.data = 0
-                for i in range(self.dataWidth // 8):
-                    readRsp.data |= self.ram[addrBase + i] << (i*8)
+                readRsp = Axi4ReadRspRef(self.ram, beatAddrs[s] & ~(wordBytes-1), wordBytes)
                 readRsp.resp = 0
                 readRsp.last = 1 if cmd.len == s else 0
                 readRsp.hid = cmd.hid
                 if readRsp.last == 1:
-                    self.reservedAddresses[readRsp] = [start, end]
+                    self.reserveAddressRange(readRsp, start, end)
                 self.readRspScoreboard.refPush(readRsp, readRsp.hid)
-                beatAddr = Axi4AddrIncr(beatAddr, cmd.burst, cmd.len, cmd.size)
 
         self.cmdTasks.put(cmd)
         # print(str(len(self.cmdTasks.queue)) + " " + str(len(self.writeTasks.queue)))
+        return True
 
 
     def genReadWriteCmd(self):
         if self.doReadWriteCmdRand.get():
             while self.cmdTasks.empty():
+                if self.getPhase() > PHASE_SIM:
+                    return WAIT_WORK # Nothing will be generated anymore
                 if self.getPhase() != PHASE_SIM:
                     return None
-                self.genNewCmd()
+                if not self.genNewCmd():
+                    return None
             return self.cmdTasks.get()
 
     def genWriteData(self):
         if self.writeDataRand.get():
             while self.writeTasks.empty():
+                if self.getPhase() > PHASE_SIM:
+                    return WAIT_WORK
                 if self.getPhase() != PHASE_SIM:
                     return None
-                self.genNewCmd()
+                if not self.genNewCmd():
+                    return None
             return self.writeTasks.get()
 
     def onWriteRsp(self,trans):
@@ -193,9 +294,248 @@ class Axi4SharedMemoryChecker(Infrastructure):
         self.readRspScoreboard.uutPush(trans, trans.hid)
         if trans.data != 0:
             self.nonZeroReadRspCounter += 1
-            if self.nonZeroReadRspCounter % 50 == 0:
-                print("progress=" + str(self.nonZeroReadRspCounter))
+
+    # Progress toward nonZeroReadRspCounterTarget, 1.0 when reached, published at each metrics export
+    def collectProgress(self, metrics):
+        metrics.gauge("cocotblib_axi4_checker_progress", self.nonZeroReadRspCounter / self.nonZeroReadRspCounterTarget, path=self.getPath())
+
+    def getCounters(self):
+        return {"nonZeroReadRsps" : self.nonZeroReadRspCounter, "pendingCmds" : self.cmdTasks.qsize(), "pendingWriteBeats" : self.writeTasks.qsize()}
 
     # override
     def hasEnoughSim(self):
+        if self.cmdCoverage != None and self.cmdCoverage.goal != None:
+            return True # cmdCoverage hold PHASE_SIM until its goal is reached
         return self.nonZeroReadRspCounter > self.nonZeroReadRspCounterTarget
+
+
+
+###############################################################################
+# AXI4 master traffic generator, for the bandwidth and latency under load characterization
+#
+# Usage :
+#
+#    traffic = Axi4TraficGenerator("traffic", phaseManager, Axi4(dut, "io_axi"), dut.clk, dut.reset)  # Or Axi4ReadOnly / Axi4WriteOnly
+#    traffic.bytesPerCycle = 6.0      # Target load, None => as fast as the DUT accept
+#    traffic.readRatio = 0.7
+#    traffic.maxOutstandingPerId = 4
+#    traffic.shapes = [(3, BURST_INCR, 15, 2), (1, BURST_WRAP, 3, 2)]  # (weight, burst, len, size)
+#    traffic.setRegion(0x0000, 0x10000)
+#    ...
+#    print(traffic.getStats())
+#
+# One coroutine drive all the channels, with up to one beat per cycle on each of them, r and b are always ready.
+# The commands are paced by one token bucket per direction, filled by bytesPerCycle * ratio each cycle.
+# Latencies are measured in cycles from the command acceptance to the last R beat / the B response.
+# getStats bytesPerCycle divide the bytes of the completed commands by the PHASE_SIM cycles only, not the drain ones.
+# Once PHASE_SIM is over and all the commands completed, the coroutine ends.
+#
+class Axi4TraficGenerator(Infrastructure):
+    def __init__(self, name, parent, axi, clk, reset, resetActiveLevel=RESET_ACTIVE_LEVEL.DEFAULT):
+        Infrastructure.__init__(self, name, parent)
+        self.axi = axi
+        self.clk = clk
+        self.reset = reset
+        self.resetActiveLevel = resetActiveLevel
+        self.doRead = hasattr(axi, "ar")
+        self.doWrite = hasattr(axi, "aw")
+        channel = axi.aw if self.doWrite else axi.ar
+        self.idCount = 1 << len(channel.payload.hid) if "hid" in channel.payload.nameToElement else 1
+        self.dataWidth = len((axi.w if self.doWrite else axi.r).payload.data)
+        self.bytesPerCycle = None
+        self.bucketSize = 4096.0 # Maximal burst of load above bytesPerCycle, in bytes
+        self.readRatio = 0.5 if self.doRead and self.doWrite else (1.0 if self.doRead else 0.0)
+        self.maxOutstandingPerId = 4
+        self.cycleTarget = 10000
+        size = log2Up(self.dataWidth//8)
+        self.shapes = [(1, BURST_INCR, 0, size), (1, BURST_INCR, 3, size), (1, BURST_INCR, 7, size), (1, BURST_INCR, 15, size)]
+        self.setRegion(0, 1 << len(channel.payload.addr))
+        self.cycleCounter = 0
+        self.simCycleCounter = 0
+        self.stats = {direction : {"cmds" : 0, "beats" : 0, "bytes" : 0, "latencies" : array('L')} for direction in ["read", "write"]}
+        self.outstanding = {"read" : [0] * self.idCount, "write" : [0] * self.idCount}
+        self.pending = {"read" : [deque() for i in range(self.idCount)], "write" : [deque() for i in range(self.idCount)]}
+        self.writeCache = WriteCache()
+        self.fork(self.stim)
+
+    def setRegion(self, base, size):
+        self.regionBase = base
+        self.regionSize = size
+        self.nextAddress = base
+
+    # First address of the region with the alignment of the burst
+    def regionFirstAddress(self, burst, byteCount, size):
+        alignment = byteCount if burst == BURST_WRAP else 1 << size
+        address = (self.regionBase + alignment-1) & ~(alignment-1)
+        if burst == BURST_INCR and burstCrossBoundary(address, byteCount, FOUR_KIB):
+            address = (address | (FOUR_KIB-1)) + 1
+        return address
+
+    # Sequential addresses in the region, INCR bursts never cross 4 KiB, WRAP bursts are aligned on their byteCount
+    def genAddress(self, burst, byteCount, size):
+        address = self.nextAddress
+        if burst == BURST_WRAP:
+            address &= ~(byteCount-1)
+        elif burst == BURST_INCR:
+            address = burstFitBoundary(address, byteCount, FOUR_KIB)
+        regionEnd = self.regionBase + self.regionSize
+        if address < self.regionBase or address + byteCount > regionEnd:
+            address = self.regionFirstAddress(burst, byteCount, size)
+            if address + byteCount > regionEnd:
+                raise Exception("%s : region 0x%x-0x%x can't hold a %d bytes burst %d" % (self.getPath(), self.regionBase, regionEnd, byteCount, burst))
+        self.nextAddress = address + byteCount
+        return address & ~((1 << size)-1)
+
+    # Return (cmd, byteCount) or None when all the IDs have maxOutstandingPerId commands
+    def genCmd(self, direction):
+        outstanding = self.outstanding[direction]
+        ids = [i for i in range(self.idCount) if outstanding[i] < self.maxOutstandingPerId]
+        if len(ids) == 0:
+            return None
+        weight, burst, length, size = random.choices(self.shapes, [s[0] for s in self.shapes])[0]
+        byteCount = (length + 1) << size
+        cmd = Transaction()
+        cmd.addr = self.genAddress(burst, byteCount, size)
+        cmd.hid = random.choice(ids)
+        cmd.len = length
+        cmd.size = size
+        cmd.burst = burst
+        outstanding[cmd.hid] += 1
+        return cmd, byteCount
+
+    def drive(self, stream, cmd):
+        cache = self.writeCache
+        cache.write(stream.valid, cmd != None)
+        if cmd != None:
+            for name, element in stream.payload.nameToElement.items():
+                cache.write(element, getattr(cmd, name, 0))
+
+    async def stim(self):
+        axi = self.axi
+        cache = self.writeCache
+        reset = rawSignal(self.reset) if self.reset != None else None
+        channels = []
+        if self.doRead:
+            channels.append(("read", axi.ar, deque()))
+            axi.r.ready <= 1
+            rValid = axi.r.rawValid
+            rLast = axi.r.payload.nameToRaw["last"]
+            rId = axi.r.payload.nameToRaw.get("hid")
+        if self.doWrite:
+            channels.append(("write", axi.aw, deque()))
+            axi.b.ready <= 1
+            bValid = axi.b.rawValid
+            bId = axi.b.payload.nameToRaw.get("hid")
+            wQueue = deque()
+            wValid = False
+        tokens = {"read" : 0.0, "write" : 0.0}
+        for direction, stream, queue in channels:
+            self.drive(stream, None)
+        if self.doWrite:
+            cache.write(axi.w.valid, 0)
+        cache.flush()
+
+        while True:
+            await RisingEdge(self.clk)
+            if reset != None and reset.read() == self.resetActiveLevel:
+                continue
+            cycle = self.cycleCounter = self.cycleCounter + 1
+            generate = self.getPhase() == PHASE_SIM
+            if generate:
+                self.simCycleCounter += 1
+
+            # Handshakes of the last cycle
+            for direction, stream, queue in channels:
+                if len(queue) != 0 and stream.rawReady.read() == 1:
+                    cmd, byteCount = queue.popleft()
+                    self.pending[direction][cmd.hid].append((cycle, byteCount))
+            if self.doWrite:
+                if wValid and axi.w.rawReady.read() == 1:
+                    wQueue.popleft()
+                    self.stats["write"]["beats"] += 1
+                if bValid.read() == 1:
+                    self.onRsp("write", bId.read() if bId != None else 0, cycle, 1)
+            if self.doRead and rValid.read() == 1:
+                self.stats["read"]["beats"] += 1
+                if rLast.read() == 1:
+                    self.onRsp("read", rId.read() if rId != None else 0, cycle, 0)
+
+            # New commands
+            for direction, stream, queue in channels:
+                ratio = self.readRatio if direction == "read" else 1.0 - self.readRatio
+                if ratio == 0.0:
+                    continue
+                if self.bytesPerCycle != None:
+                    tokens[direction] = min(tokens[direction] + self.bytesPerCycle * ratio, self.bucketSize)
+                if not generate or len(queue) >= 2:
+                    continue
+                if self.bytesPerCycle != None and tokens[direction] < 0:
+                    continue
+                if self.bytesPerCycle == None and self.doRead and self.doWrite and random.random() >= ratio:
+                    continue
+                gen = self.genCmd(direction)
+                if gen == None:
+                    continue
+                cmd, byteCount = gen
+                tokens[direction] -= byteCount
+                queue.append(gen)
+                if direction == "write":
+                    addresses, lanes = burstSequence(cmd.addr, cmd.len, cmd.size, cmd.burst, self.dataWidth)
+                    for beat in range(cmd.len + 1):
+                        wQueue.append((randBits(self.dataWidth), lanes[beat], int(beat == cmd.len)))
+
+            # Drive
+            for direction, stream, queue in channels:
+                self.drive(stream, queue[0][0] if len(queue) != 0 else None)
+            if self.doWrite:
+                wValid = len(wQueue) != 0
+                cache.write(axi.w.valid, wValid)
+                if wValid:
+                    data, strb, last = wQueue[0]
+                    cache.write(axi.w.payload.data, data)
+                    cache.write(axi.w.payload.strb, strb)
+                    cache.write(axi.w.payload.last, last)
+            cache.flush()
+
+            # Drained after PHASE_SIM, nothing will be generated anymore
+            if self.getPhase() > PHASE_SIM and not any(any(outstanding) for outstanding in self.outstanding.values()):
+                return
+
+    def onRsp(self, direction, hid, cycle, beats):
+        if len(self.pending[direction][hid]) == 0:
+            raise TestFailure("%s : %s response without command for ID %d" % (self.getPath(), direction, hid))
+        start, byteCount = self.pending[direction][hid].popleft()
+        self.outstanding[direction][hid] -= 1
+        stats = self.stats[direction]
+        stats["cmds"] += 1
+        stats["bytes"] += byteCount
+        stats["latencies"].append(cycle - start)
+
+    def getStats(self):
+        stats = {}
+        for direction, s in self.stats.items():
+            latencies = sorted(s["latencies"])
+            count = len(latencies)
+            stats[direction] = {
+                "cmds" : s["cmds"],
+                "bytes" : s["bytes"],
+                "bytesPerCycle" : s["bytes"] / self.simCycleCounter if self.simCycleCounter != 0 else 0.0,
+                "latencyAvg" : sum(latencies) / count if count != 0 else None,
+                "latencyP50" : latencies[count // 2] if count != 0 else None,
+                "latencyP99" : latencies[min(count-1, count * 99 // 100)] if count != 0 else None,
+                "latencyMax" : latencies[-1] if count != 0 else None
+            }
+        return stats
+
+    def getCounters(self):
+        return {direction + "Bytes" : s["bytes"] for direction, s in self.stats.items()}
+
+    def hasEnoughSim(self):
+        return self.simCycleCounter >= self.cycleTarget
+
+    def canPhaseProgress(self, phase):
+        if phase == PHASE_WAIT_TASKS_END:
+            for outstanding in self.outstanding.values():
+                if any(outstanding):
+                    return False
+        return Infrastructure.canPhaseProgress(self, phase)
@@ -0,0 +1,273 @@
+import argparse
+import atexit
+import contextlib
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import cocotb
+
+from cocotblib.AhbLite3 import AhbLite3TraficGenerator
+from cocotblib.Axi4 import Axi4Shared, Axi4SharedMemoryChecker
+from cocotblib.Protocol import ProtocolChecker
+from cocotblib.Scorboard import ScorboardInOrder, ScorboardOutOfOrder
+from cocotblib.Stream import Transaction, TransactionFromBundle
+from cocotblib.misc import Bundle, readIHex
+
+
+###############################################################################
+# Microbenchmarks of the library hot paths, without any simulator
+#
+# Usage :
+#
+#    python -m cocotblib.Benchmark --write-baseline baseline.json
+#    python -m cocotblib.Benchmark --baseline baseline.json   # Exit code 1 on a regression, 2 if the baseline is missing
+#
+# peakBytes is the traced memory peak reached by one operation, over what was allocated before it.
+#
+
+
+###############################################################################
+# Stand-in DUT handles, only what the library use out of the simulator ones
+#
+class FakeSignal:
+    def __init__(self, name, width, value=0):
+        self._name = name
+        self.width = width
+        self.value = value
+
+    def __le__(self, value):
+        self.value = int(value) & ((1 << self.width)-1)
+
+    def __int__(self):
+        return self.value
+
+    def __len__(self):
+        return self.width
+
+    __hash__ = object.__hash__
+
+
+class FakeDut:
+    def __init__(self, signals):
+        self._signals = {s._name : s for s in signals}
+
+    def __getattr__(self, name):
+        signals = self.__dict__["_signals"]
+        if name not in signals:
+            raise AttributeError(name)
+        return signals[name]
+
+    def __iter__(self):
+        return iter(self._signals.values())
+
+
+def fakeStream(name, payloads):
+    signals = [FakeSignal(name + "_valid", 1), FakeSignal(name + "_ready", 1)]
+    for payloadName, width in payloads:
+        signals.append(FakeSignal(name + "_payload_" + payloadName, width, random.getrandbits(width)))
+    return signals
+
+def fakeAxi4Shared(name, addressWidth, dataWidth, idWidth):
+    cmd = [("addr", addressWidth), ("id", idWidth), ("region", 4), ("len", 8), ("size", 3), ("burst", 2),
+           ("lock", 1), ("cache", 4), ("qos", 4), ("prot", 3), ("write", 1)]
+    return FakeDut(
+        fakeStream(name + "_arw", cmd) +
+        fakeStream(name + "_w", [("data", dataWidth), ("strb", dataWidth//8), ("last", 1)]) +
+        fakeStream(name + "_b", [("id", idWidth), ("resp", 2)]) +
+        fakeStream(name + "_r", [("data", dataWidth), ("id", idWidth), ("resp", 2), ("last", 1)])
+    )
+
+
+# Components fork their coroutines in their constructors, there is no scheduler there
+@contextlib.contextmanager
+def noFork():
+    fork = cocotb.fork
+    cocotb.fork = lambda coroutine: coroutine.close()
+    try:
+        yield
+    finally:
+        cocotb.fork = fork
+
+
+###############################################################################
+# Benchmarks, each one return the function doing one operation
+#
+def benchBundle():
+    dut = FakeDut(fakeStream("io_push", [("a", 8), ("b", 32), ("c", 64), ("d", 128)]) + [FakeSignal("io_other_%d" % i, 8) for i in range(32)])
+    return lambda: Bundle(dut, "io_push_payload")
+
+def benchTransactionFromBundle():
+    dut = FakeDut(fakeStream("io_push", [("a", 8), ("b", 32), ("c", 64), ("d", 128)]))
+    bundle = Bundle(dut, "io_push_payload")
+    return lambda: TransactionFromBundle(bundle)
+
+def benchEqualRef():
+    a = Transaction()
+    b = Transaction()
+    for name in ["a", "b", "c", "d", "e", "f"]:
+        value = random.getrandbits(64)
+        setattr(a, name, value)
+        setattr(b, name, value)
+    return lambda: a.equalRef(b)
+
+def benchScorboardInOrder():
+    scoreboard = ScorboardInOrder("scoreboard", None)
+    trans = Transaction()
+    trans.data = 42
+    def op():
+        scoreboard.refPush(trans)
+        scoreboard.uutPush(trans)
+    return op
+
+def benchScorboardOutOfOrder():
+    scoreboard = ScorboardOutOfOrder("scoreboard", None)
+    trans = Transaction()
+    trans.data = 42
+    ids = [random.getrandbits(4) for i in range(1024)]
+    state = [0]
+    def op():
+        oooid = ids[state[0] & 1023]
+        state[0] += 1
+        scoreboard.refPush(trans, oooid)
+        scoreboard.uutPush(trans, oooid)
+    return op
+
+def benchAhbLite3TraficGenerator():
+    generator = AhbLite3TraficGenerator(32, 512)
+    return generator.getTransactions
+
+def benchAxi4SharedMemoryCheckerGenNewCmd():
+    with noFork():
+        checker = Axi4SharedMemoryChecker("checker", None, Axi4Shared(fakeAxi4Shared("axi", 16, 512, 4), "axi"), 12, None, None)
+    def op():
+        checker.genNewCmd()
+        checker.reservedAddresses.clear()
+        checker.cmdTasks.queue.clear()
+        checker.writeTasks.queue.clear()
+        checker.readRspScoreboard.refsDic.clear()
+        checker.writeRspScoreboard.refsDic.clear()
+    return op
+
+# Stalled arw and w, idle r and b
+def benchProtocolCheckerAxi4Shared():
+    dut = fakeAxi4Shared("axi", 32, 32, 4)
+    with noFork():
+        checker = ProtocolChecker("protocol", None, None)
+    checker.addAxi4("axi", Axi4Shared(dut, "axi"))
+    dut.axi_arw_valid <= 1
+    dut.axi_w_valid <= 1
+    return checker.checkCycle
+
+def benchReadIHex():
+    file = tempfile.NamedTemporaryFile("w", suffix=".hex", delete=False)
+    for i in range(1024):
+        data = [random.getrandbits(8) for b in range(16)]
+        line = "10%04X00" % ((i*16) & 0xFFFF) + "".join("%02X" % b for b in data)
+        file.write(":" + line + "00\n")
+    file.close()
+    atexit.register(os.remove, file.name)
+    return lambda: readIHex(file.name, lambda address, array, context: None, None)
+
+
+benchmarks = [
+    ("Bundle", benchBundle),
+    ("TransactionFromBundle", benchTransactionFromBundle),
+    ("Transaction.equalRef", benchEqualRef),
+    ("ScorboardInOrder", benchScorboardInOrder),
+    ("ScorboardOutOfOrder", benchScorboardOutOfOrder),
+    ("AhbLite3TraficGenerator.getTransactions", benchAhbLite3TraficGenerator),
+    ("Axi4SharedMemoryChecker.genNewCmd", benchAxi4SharedMemoryCheckerGenNewCmd),
+    ("ProtocolChecker.checkCycle", benchProtocolCheckerAxi4Shared),
+    ("readIHex", benchReadIHex)
+]
+
+
+##########################################################################
+# Measure the ops/s over duration seconds and the traced memory peak reached by one operation
+def measure(op, duration, peakSamples=100):
+    for i in range(10):
+        op()
+
+    iterations = 0
+    batch = 1
+    start = time.perf_counter()
+    while True:
+        for i in range(batch):
+            op()
+        iterations += batch
+        elapsed = time.perf_counter() - start
+        if elapsed >= duration:
+            break
+        batch = min(batch*2, 1 << 16)
+
+    tracemalloc.start()
+    peakBytes = 0
+    for i in range(peakSamples):
+        base = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        op()
+        peakBytes += tracemalloc.get_traced_memory()[1] - base
+    tracemalloc.stop()
+    return {"opsPerSec" : iterations / elapsed, "peakBytes" : peakBytes / peakSamples}
+
+
+def run(duration=1.0, nameFilter=None, seed=42):
+    results = {}
+    for name, factory in benchmarks:
+        if nameFilter != None and nameFilter not in name:
+            continue
+        random.seed(seed)
+        results[name] = measure(factory(), duration)
+    return results
+
+
+def report(results, baseline=None, threshold=0.1):
+    regressions = []
+    buffer = "%-42s %14s %12s %10s\n" % ("benchmark", "ops/s", "peak B/op", "vs base")
+    for name, result in results.items():
+        ratio = ""
+        if baseline != None and name in baseline:
+            r = result["opsPerSec"] / baseline[name]["opsPerSec"]
+            ratio = "%.2fx" % r
+            if r < 1.0 - threshold:
+                regressions.append(name)
+                ratio += " !"
+        buffer += "%-42s %14.1f %12.1f %10s\n" % (name, result["opsPerSec"], result["peakBytes"], ratio)
+    return buffer, regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="cocotblib hot paths microbenchmarks")
+    parser.add_argument("--time", type=float, default=1.0, help="seconds per benchmark")
+    parser.add_argument("--filter", default=None, help="only run the benchmarks containing this name")
+    parser.add_argument("--baseline", default=None, help="JSON results to compare with, it has to exist")
+    parser.add_argument("--write-baseline", default=None, help="write the results as the baseline to compare with later")
+    parser.add_argument("--save", default=None, help="write the results as JSON")
+    parser.add_argument("--threshold", type=float, default=0.1, help="slowdown ratio reported as regression")
+    args = parser.parse_args(argv)
+
+    baseline = None
+    if args.baseline != None:
+        if not os.path.exists(args.baseline):
+            print("Baseline %s doesn't exist, create it with --write-baseline" % args.baseline, file=sys.stderr)
+            return 2
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+    results = run(args.time, args.filter)
+    buffer, regressions = report(results, baseline, args.threshold)
+    print(buffer)
+    for path in [args.save, args.write_baseline]:
+        if path != None:
+            with open(path, "w") as f:
+                json.dump(results, f, indent=2)
+    return 1 if len(regressions) != 0 else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
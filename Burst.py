@@ -0,0 +1,80 @@
+###############################################################################
+# Burst address sequences shared by the AXI4 and AHB-Lite models
+#
+# Burst kinds use the AXI4 encoding, AHB-Lite HBURST values are translated by
+# AhbLite3Burst.
+#
+BURST_FIXED = 0
+BURST_INCR  = 1
+BURST_WRAP  = 2
+
+ONE_KIB  = 1 << 10  # AHB-Lite bursts must not cross it
+FOUR_KIB = 1 << 12  # AXI4 bursts must not cross it
+
+
+# (offset, len, size, burst, wordBytes) => (beat offsets, beat byte lanes)
+_shapes = {}
+
+def _burstShape(offset, len, size, burst, wordBytes):
+    bytesPerBeat = 1 << size
+    burstBytes = bytesPerBeat * (len + 1)
+    offsets = []
+    lanes = []
+    address = offset
+    for beat in range(len + 1):
+        aligned = address & ~(bytesPerBeat-1)
+        low = address % wordBytes
+        high = aligned % wordBytes + bytesPerBeat
+        offsets.append(address)
+        lanes.append(((1 << high)-1) & ~((1 << low)-1))
+        if burst == BURST_INCR:
+            address = aligned + bytesPerBeat
+        elif burst == BURST_WRAP:
+            address = (offset & ~(burstBytes-1)) | ((aligned + bytesPerBeat) & (burstBytes-1))
+    return tuple(offsets), tuple(lanes)
+
+
+##########################################################################
+# Expand a burst into its beat addresses and byte lane masks (bit n => byte lane n is active)
+#
+# @param address   : Address of the first beat
+# @param len       : Number of beats - 1 (AXI4 AxLEN)
+# @param size      : log2 of the bytes per beat (AXI4 AxSIZE / AHB HSIZE)
+# @param burst     : BURST_FIXED, BURST_INCR or BURST_WRAP
+# @param dataWidth : Data bus width in bits
+#
+# The shape of a burst only depend on the address bits below the wrap/word alignment, so it is cached on that
+def burstSequence(address, len, size, burst, dataWidth):
+    wordBytes = dataWidth // 8
+    align = wordBytes
+    if burst == BURST_WRAP:
+        align = max(align, (1 << size) * (len + 1))
+    offset = address & (align-1)
+    key = (offset, len, size, burst, wordBytes)
+    shape = _shapes.get(key)
+    if shape == None:
+        shape = _burstShape(offset, len, size, burst, wordBytes)
+        _shapes[key] = shape
+    base = address - offset
+    return [base + o for o in shape[0]], shape[1]
+
+
+def burstCrossBoundary(address, byteCount, boundary):
+    return (address % boundary) + byteCount > boundary
+
+
+# Move an INCR burst start backward to the last address where it fits before the next boundary
+def burstFitBoundary(address, byteCount, boundary):
+    if burstCrossBoundary(address, byteCount, boundary):
+        return (address - address % boundary) + boundary - byteCount
+    return address
+
+
+##########################################################################
+# AHB-Lite HBURST => (burst kind, beat count), beat count is None for the undefined length INCR
+def AhbLite3Burst(hburst):
+    if hburst == 0:
+        return BURST_INCR, 1
+    if hburst == 1:
+        return BURST_INCR, None
+    return (BURST_INCR if hburst & 1 == 1 else BURST_WRAP), [4, 8, 16][(hburst >> 1) - 1]
@@ -8,6 +8,7 @@ from cocotb.triggers import Timer, RisingEdge, Event
 class RESET_ACTIVE_LEVEL:
     HIGH = 1
     LOW  = 0
+    DEFAULT = LOW # Of the ClockDomain and of the components watching a reset
 
 
 ###############################################################################
@@ -29,7 +30,7 @@ class ClockDomain:
     # @param halfPeriod       : Half period time
     # @param reset            : Reset generated
     # @param resetactiveLevel : Reset active low or high
-    def __init__(self, clk, halfPeriod, reset=None, resetActiveLevel=RESET_ACTIVE_LEVEL.LOW):
+    def __init__(self, clk, halfPeriod, reset=None, resetActiveLevel=RESET_ACTIVE_LEVEL.DEFAULT):
 
         self.halfPeriod = halfPeriod
 
@@ -42,8 +43,7 @@ class ClockDomain:
 
     ##########################################################################
     # Generate the clock signals
-    @cocotb.coroutine
-    def start(self):
+    async def start(self):
 
         self.fork_gen = cocotb.fork(self._clkGen())
         if self.reset != None :
@@ -52,7 +52,7 @@ class ClockDomain:
         if self.reset:
             self.reset <= self.typeReset
 
-        yield Timer(self.halfPeriod * 5)
+        await Timer(self.halfPeriod * 5)
 
         if self.reset:
             self.reset <= int(1 if self.typeReset == RESET_ACTIVE_LEVEL.LOW else 0)
@@ -67,21 +67,19 @@ class ClockDomain:
 
     ##########################################################################
     # Generate the clk
-    @cocotb.coroutine
-    def _clkGen(self):
+    async def _clkGen(self):
         while True:
             self.clk <= 0
-            yield Timer(self.halfPeriod)
+            await Timer(self.halfPeriod)
             self.clk <= 1
-            yield Timer(self.halfPeriod)
+            await Timer(self.halfPeriod)
 
 
     ##########################################################################
     # Wait the end of the reset
-    @cocotb.coroutine
-    def _waitEndReset(self):
+    async def _waitEndReset(self):
         while True:
-            yield RisingEdge(self.clk)
+            await RisingEdge(self.clk)
             valueReset = int(1 if self.typeReset == RESET_ACTIVE_LEVEL.LOW else 0)
             if int(self.reset) == valueReset:
                 self.event_endReset.set()
@@ -0,0 +1,125 @@
+import itertools
+import random
+from array import array
+
+from cocotblib.Phase import Infrastructure
+
+
+###############################################################################
+# Cover point, map a sampled value to one of its bins
+#
+# @param name     : Name used in the reports
+# @param binCount : Number of bins
+# @param binOf    : value => bin index, the value itself by default
+#
+class CoverPoint:
+    def __init__(self, name, binCount, binOf=None):
+        self.name = name
+        self.binCount = binCount
+        self.binOf = binOf
+
+
+# len 0 => bin 0, 1 => 1, 2..3 => 2, 4..7 => 3, ...
+def binLog2(value):
+    return value.bit_length()
+
+# Random value of a binLog2 bin
+def randBinLog2(b):
+    if b == 0:
+        return 0
+    return random.randint(1 << (b-1), (1 << b)-1)
+
+
+###############################################################################
+# Cross of cover points, all the bins hit counters are stored in one flat array
+#
+# Usage :
+#
+#    coverage = CoverGroup("burstCoverage", parent, [CoverPoint("burst", 3), CoverPoint("size", 4)])
+#    coverage.goal = 1.0  # PHASE_SIM can't end before all the bins are hit
+#    coverage.sample(burst, size)
+#
+class CoverGroup(Infrastructure):
+    def __init__(self, name, parent, points, atLeast=1):
+        Infrastructure.__init__(self, name, parent)
+        self.points = points
+        self.atLeast = atLeast
+        self.goal = None
+        self.binCount = 1
+        for point in points:
+            self.binCount *= point.binCount
+        self.hits = array('L', [0]) * self.binCount
+        self.ignored = bytearray(self.binCount)
+        self.ignoredCount = 0
+        self.coveredCount = 0
+        self.holes = None
+        self.holesCoveredCount = None
+
+    def sample(self, *values):
+        index = 0
+        for point, value in zip(self.points, values):
+            b = value if point.binOf == None else point.binOf(value)
+            if not 0 <= b < point.binCount:
+                raise Exception("%s : %s value %s is out of its %d bins" % (self.getPath(), point.name, value, point.binCount))
+            index = index * point.binCount + b
+        hits = self.hits[index] + 1
+        self.hits[index] = hits
+        if hits == self.atLeast and not self.ignored[index]:
+            self.coveredCount += 1
+
+    def getBins(self, index):
+        bins = []
+        for point in reversed(self.points):
+            bins.insert(0, index % point.binCount)
+            index //= point.binCount
+        return tuple(bins)
+
+    def getIndex(self, bins):
+        index = 0
+        for point, b in zip(self.points, bins):
+            index = index * point.binCount + b
+        return index
+
+    # Exclude the bins for which predicate(*bins) is True from the coverage
+    def ignore(self, predicate):
+        for bins in itertools.product(*[range(point.binCount) for point in self.points]):
+            index = self.getIndex(bins)
+            if not self.ignored[index] and predicate(*bins):
+                self.ignored[index] = 1
+                self.ignoredCount += 1
+                if self.hits[index] >= self.atLeast:
+                    self.coveredCount -= 1
+        self.holesCoveredCount = None
+
+    def getCoverage(self):
+        total = self.binCount - self.ignoredCount
+        return 1.0 if total == 0 else self.coveredCount / total
+
+    def getHoles(self):
+        return [self.getBins(index) for index in range(self.binCount) if self.hits[index] < self.atLeast and not self.ignored[index]]
+
+    # Random not yet covered bins, used to bias the stimulus generators, None when everything is covered
+    def pickHole(self):
+        if self.holesCoveredCount != self.coveredCount:
+            self.holes = self.getHoles()
+            self.holesCoveredCount = self.coveredCount
+        if len(self.holes) == 0:
+            return None
+        return random.choice(self.holes)
+
+    def isCovered(self):
+        return self.goal != None and self.getCoverage() >= self.goal
+
+    # override
+    def hasEnoughSim(self):
+        return self.goal == None or self.isCovered()
+
+    def getCounters(self):
+        return {"coverage" : self.getCoverage(), "covered" : self.coveredCount, "bins" : self.binCount - self.ignoredCount}
+
+    def __str__(self):
+        buffer = "%s : %.1f%% (%d/%d)\n" % (self.getPath(), self.getCoverage()*100, self.coveredCount, self.binCount - self.ignoredCount)
+        names = [point.name for point in self.points]
+        for bins in self.getHoles():
+            buffer += "    hole " + " ".join("%s=%d" % (n, b) for n, b in zip(names, bins)) + "\n"
+        return buffer
@@ -1,6 +1,6 @@
 import cocotb
 from cocotb.triggers import RisingEdge, Event
-from cocotblib.misc import Bundle
+from cocotblib.misc import Bundle, BundleCapture, rawSignal
 
 
 ###############################################################################
@@ -16,16 +16,22 @@ class Flow:
         # interface
         self.valid = dut.__getattr__(name + "_valid")
         self.payload = Bundle(dut,name + "_payload")
+        self.rawValid = rawSignal(self.valid)
 
         # Event
         self.event_valid = Event()
+        self.captureValid = None
 
 
     #==========================================================================
     # Start to monitor the valid signal
+    # With a capacity, the payloads are copied into captureValid (BundleCapture)
+    # and event_valid is set with it instead of the live payload
     #==========================================================================
-    def startMonitoringValid(self, clk):
+    def startMonitoringValid(self, clk, capacity=None):
         self.clk  = clk
+        if capacity != None:
+            self.captureValid = BundleCapture(self.payload, capacity)
         self.fork_valid = cocotb.fork(self.monitor_valid())
 
 
@@ -39,9 +45,13 @@ class Flow:
     #==========================================================================
     # Monitor the valid signal
     #==========================================================================
-    @cocotb.coroutine
-    def monitor_valid(self):
+    async def monitor_valid(self):
+        capture = self.captureValid
         while True:
-            yield RisingEdge(self.clk)
-            if int(self.valid) == 1:
-                self.event_valid.set( self.payload )
+            await RisingEdge(self.clk)
+            if self.rawValid.read() == 1:
+                if capture != None:
+                    capture.sample()
+                    self.event_valid.set( capture )
+                else:
+                    self.event_valid.set( self.payload )
@@ -0,0 +1,101 @@
+###############################################################################
+# Memory latency profiles, used by the memory models to insert wait states
+#
+# Usage :
+#
+#    memory = AhbLite3SlaveMemory(ahb, 0, 0x10000, dut.clk, dut.reset)
+#    memory.latency = DramLatency(pageHit=2, pageMiss=10, pageSize=1024, bankCount=4)
+#
+# A profile is queried once per transfer by getLatency(address, write, sequential), sequential being
+# True for the beats following the first one of a burst, and return the number of wait states.
+#
+
+
+class FixedLatency:
+    def __init__(self, waitStates):
+        self.waitStates = waitStates
+
+    def getLatency(self, address, write, sequential):
+        return self.waitStates
+
+
+class FirstNextLatency:
+    def __init__(self, first, next):
+        self.first = first
+        self.next = next
+
+    def getLatency(self, address, write, sequential):
+        return self.next if sequential else self.first
+
+
+# One open row per bank, address => [row][bank][column]
+class DramLatency:
+    def __init__(self, pageHit=2, pageMiss=10, pageEmpty=None, pageSize=2048, bankCount=4, writeExtra=0):
+        self.pageHit = pageHit
+        self.pageMiss = pageMiss
+        self.pageEmpty = pageEmpty if pageEmpty != None else pageMiss
+        self.pageSize = pageSize
+        self.bankCount = bankCount
+        self.writeExtra = writeExtra
+        self.openRows = [None] * bankCount
+        self.hitCounter = 0
+        self.missCounter = 0
+
+    def getLatency(self, address, write, sequential):
+        page = address // self.pageSize
+        bank = page % self.bankCount
+        row = page // self.bankCount
+        openRow = self.openRows[bank]
+        if openRow == row:
+            self.hitCounter += 1
+            latency = self.pageHit
+        else:
+            self.missCounter += 1
+            latency = self.pageEmpty if openRow == None else self.pageMiss
+            self.openRows[bank] = row
+        return latency + (self.writeExtra if write else 0)
+
+    # Close all the rows, as a refresh would do
+    def precharge(self):
+        self.openRows = [None] * self.bankCount
+
+
+# Replay recorded latencies, in order
+class TraceLatency:
+    def __init__(self, latencies, loop=True):
+        self.latencies = list(latencies)
+        if len(self.latencies) == 0:
+            raise Exception("TraceLatency need at least one latency")
+        self.loop = loop
+        self.index = 0
+
+    # Text file with the latencies separated by white spaces
+    @classmethod
+    def load(cls, path, loop=True):
+        with open(path) as f:
+            return cls([int(value) for value in f.read().split()], loop)
+
+    def getLatency(self, address, write, sequential):
+        if self.index == len(self.latencies):
+            if not self.loop:
+                return 0
+            self.index = 0
+        latency = self.latencies[self.index]
+        self.index += 1
+        return latency
+
+
+# Record the latencies given by an other profile, to be replayed by TraceLatency
+class RecordLatency:
+    def __init__(self, profile):
+        self.profile = profile
+        self.latencies = []
+
+    def getLatency(self, address, write, sequential):
+        latency = self.profile.getLatency(address, write, sequential)
+        self.latencies.append(latency)
+        return latency
+
+    def save(self, path):
+        with open(path, "w") as f:
+            f.write("\n".join(str(latency) for latency in self.latencies) + "\n")
@@ -0,0 +1,129 @@
+import json
+import os
+import time
+
+from cocotb.triggers import ClockCycles
+from cocotb.utils import get_sim_time
+
+# When set, the metrics are exported into this file, Prometheus text format if it ends with .prom, JSON lines otherwise
+METRICS_ENV = "COCOTBLIB_METRICS"
+
+COUNTER = "counter"
+GAUGE = "gauge"
+
+
+###############################################################################
+# Registry of counters and gauges, exported periodically
+#
+# Usage :
+#
+#    metrics = getMetrics()
+#    metrics.watchInfrastructure(phaseManager)  # All the getCounters() of the tree, as gauges
+#    metrics.watchStreamMonitor("io_pop", popMonitor)
+#    metrics.counter("frames", 1, port="eth0")
+#    cocotb.fork(metrics.exporter(dut.clk))      # Into $COCOTBLIB_METRICS every second
+#
+# Collectors are called just before each export, they are the way to publish values without any cost in the hot paths.
+#
+class Metrics:
+    def __init__(self):
+        self.values = {}
+        self.kinds = {}
+        self.collectors = []
+        self.startTime = time.time()
+
+    def _set(self, kind, name, value, labels):
+        self.kinds[name] = kind
+        self.values[(name, tuple(sorted(labels.items())))] = value
+
+    def counter(self, name, increment=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        self.kinds[name] = COUNTER
+        self.values[key] = self.values.get(key, 0) + increment
+
+    def setCounter(self, name, value, **labels):
+        self._set(COUNTER, name, value, labels)
+
+    def gauge(self, name, value, **labels):
+        self._set(GAUGE, name, value, labels)
+
+    # collector(metrics) is called before each export
+    def addCollector(self, collector):
+        self.collectors.append(collector)
+
+    def removeCollector(self, collector):
+        self.collectors.remove(collector)
+
+    def watchInfrastructure(self, infrastructure):
+        def collector(metrics):
+            for path, counters in infrastructure.collectCounters({}).items():
+                for name, value in counters.items():
+                    metrics.gauge("cocotblib_" + name, value, path=path)
+        self.addCollector(collector)
+        return collector
+
+    def watchStreamMonitor(self, name, monitor):
+        collector = lambda metrics: metrics.setCounter("cocotblib_stream_transfers", monitor.transferCounter, stream=name)
+        self.addCollector(collector)
+        return collector
+
+    def collect(self):
+        for collector in self.collectors:
+            collector(self)
+        self.gauge("cocotblib_sim_time", get_sim_time())
+        self.gauge("cocotblib_wall_time", time.time() - self.startTime)
+
+    def toDict(self):
+        metrics = {}
+        for (name, labels), value in self.values.items():
+            if len(labels) != 0:
+                name += "{" + ",".join("%s=%s" % (k, v) for k, v in labels) + "}"
+            metrics[name] = value
+        return metrics
+
+    def toPrometheus(self):
+        buffer = ""
+        lastName = None
+        for (name, labels), value in sorted(self.values.items(), key=lambda e: e[0]):
+            if name != lastName:
+                buffer += "# TYPE %s %s\n" % (name, self.kinds[name])
+                lastName = name
+            if len(labels) != 0:
+                buffer += "%s{%s} %s\n" % (name, ",".join('%s="%s"' % (k, str(v).replace('"', '\\"')) for k, v in labels), value)
+            else:
+                buffer += "%s %s\n" % (name, value)
+        return buffer
+
+    # Collect and write the metrics, nothing is done without path or METRICS_ENV
+    def export(self, path=None):
+        path = path if path != None else os.environ.get(METRICS_ENV)
+        if not path:
+            return
+        self.collect()
+        if path.endswith(".prom"):
+            # Scrapers can read the file at any time, replace it atomically
+            with open(path + ".tmp", "w") as f:
+                f.write(self.toPrometheus())
+            os.replace(path + ".tmp", path)
+        else:
+            with open(path, "a") as f:
+                f.write(json.dumps({"time" : time.time(), "metrics" : self.toDict()}) + "\n")
+
+    # Export every period seconds of wall time, the wall clock is only checked every checkCycles
+    async def exporter(self, clk, path=None, period=1.0, checkCycles=1000):
+        path = path if path != None else os.environ.get(METRICS_ENV)
+        if not path:
+            return
+        lastTime = time.time()
+        while True:
+            await ClockCycles(clk, checkCycles)
+            thisTime = time.time()
+            if thisTime - lastTime >= period:
+                lastTime = thisTime
+                self.export(path)
+
+
+_metrics = Metrics()
+
+def getMetrics():
+    return _metrics
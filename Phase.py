@@ -1,6 +1,13 @@
+import json
+import os
+import time
+
 import cocotb
 from cocotb.result import TestFailure, TestError
 from cocotb.triggers import Timer
+from cocotb.utils import get_sim_time
+
+from cocotblib.Metrics import getMetrics
 
 PHASE_NULL = 0
 PHASE_SIM = 100
@@ -8,7 +15,30 @@ PHASE_WAIT_TASKS_END = 200
 PHASE_CHECK_SCORBOARDS = 300
 PHASE_DONE = 400
 
+# When set, PhaseManager.run dumps a JSON report of the run into this file (see Regression.py)
+REPORT_ENV = "COCOTBLIB_REPORT"
+
+
+# Fork the coroutine given by factory(), registered into parent when there is one
+def forkIn(parent, factory):
+    if parent == None:
+        return cocotb.fork(factory())
+    return parent.fork(factory)
 
+
+###############################################################################
+# Node of the testbench tree, with the phase hooks and the lifecycle of its tasks
+#
+# Tasks forked through fork(factory) are registered into the node, factory being a callable returning the
+# coroutine (a bound async method as self.stim). stop/pause/resume apply to the whole subtree :
+# - stop kills the tasks, for good
+# - pause kills the tasks but keep their factories, resume re-forks them from the start of their coroutine
+#   instead of continuing them (a coroutine can't be frozen), so their local state is lost. resume does nothing on a
+#   node which isn't paused
+# A node created under a paused parent starts paused, its fork(factory) are delayed to the resume.
+# The signals keep their last driven values, pause the drivers when no transfer is in flight.
+# PhaseManager stops all of them when entering PHASE_DONE.
+#
 class Infrastructure:
     def __init__(self,name,parent):
         self.name = name
@@ -16,6 +46,38 @@ class Infrastructure:
         if parent != None:
             parent.addChild(self)
         self.children = []
+        self.tasks = []
+        self.paused = parent != None and parent.paused
+
+    def fork(self, factory):
+        task = None if self.paused else cocotb.fork(factory())
+        self.tasks.append((factory, task))
+        return task
+
+    def stop(self):
+        for factory, task in self.tasks:
+            if task != None:
+                task.kill()
+        self.tasks = []
+        for child in self.children:
+            child.stop()
+
+    def pause(self):
+        self.paused = True
+        for factory, task in self.tasks:
+            if task != None:
+                task.kill()
+        self.tasks = [(factory, None) for factory, task in self.tasks]
+        for child in self.children:
+            child.pause()
+
+    def resume(self):
+        if not self.paused:
+            return
+        self.paused = False
+        self.tasks = [(factory, cocotb.fork(factory()) if task == None else task) for factory, task in self.tasks]
+        for child in self.children:
+            child.resume()
 
     def getPhase(self):
         return self.parent.getPhase()
@@ -50,6 +112,18 @@ class Infrastructure:
         else:
             return self.name
 
+    # Counters published into the run report, override it
+    def getCounters(self):
+        return {}
+
+    def collectCounters(self, counters):
+        mine = self.getCounters()
+        if len(mine) != 0:
+            counters[self.getPath()] = mine
+        for child in self.children:
+            child.collectCounters(counters)
+        return counters
+
 
 class PhaseManager(Infrastructure):
     def __init__(self):
@@ -57,17 +131,21 @@ class PhaseManager(Infrastructure):
         self.phase = PHASE_NULL
         self.name = "top"
         self.waitTasksEndTime = 0
+        self.clockPeriod = None
         # setSimManager(self)
 
     def setWaitTasksEndTime(self,value):
         self.waitTasksEndTime = value
 
-    @cocotb.coroutine
-    def waitChild(self):
+    # Used to translate the simulation time into a cycle count in the run report
+    def setClockPeriod(self,value):
+        self.clockPeriod = value
+
+    async def waitChild(self):
         while True:
             if self.canPhaseProgress(self.phase):
                 break
-            yield Timer(10000)
+            await Timer(10000)
 
     def getPhase(self):
         return self.phase
@@ -79,15 +157,36 @@ class PhaseManager(Infrastructure):
         for infra in self.children:
             infra.startPhase(self.phase)
 
-    @cocotb.coroutine
-    def run(self):
+    def getReport(self):
+        simTime = get_sim_time()
+        return {
+            "phase"    : self.phase,
+            "simTime"  : simTime,
+            "cycles"   : None if self.clockPeriod == None else int(simTime // self.clockPeriod),
+            "wallTime" : time.time() - self.startTime,
+            "counters" : self.collectCounters({})
+        }
+
+    def writeReport(self):
+        path = os.environ.get(REPORT_ENV)
+        if path:
+            with open(path, "w") as f:
+                json.dump(self.getReport(), f, indent=2)
+
+    async def run(self):
+        self.startTime = time.time()
         self.switchPhase(PHASE_SIM)
-        yield self.waitChild()
+        await self.waitChild()
         self.switchPhase(PHASE_WAIT_TASKS_END)
-        yield self.waitChild()
-        yield Timer(self.waitTasksEndTime)
-        self.switchPhase(PHASE_CHECK_SCORBOARDS)
-        self.switchPhase(PHASE_DONE)
+        await self.waitChild()
+        await Timer(self.waitTasksEndTime)
+        try:
+            self.switchPhase(PHASE_CHECK_SCORBOARDS)
+            self.switchPhase(PHASE_DONE)
+        finally:
+            self.stop()
+            self.writeReport()
+            getMetrics().export()
 
 # _simManager = None
 #
@@ -0,0 +1,342 @@
+from collections import deque
+
+import cocotb
+from cocotb.result import TestFailure
+from cocotb.triggers import RisingEdge
+
+from cocotblib.Burst import burstSequence, burstCrossBoundary, AhbLite3Burst, BURST_FIXED, BURST_INCR, BURST_WRAP, ONE_KIB, FOUR_KIB
+from cocotblib.ClockDomain import RESET_ACTIVE_LEVEL
+from cocotblib.Phase import Infrastructure, PHASE_CHECK_SCORBOARDS
+from cocotblib.misc import log2Up, rawSignal
+
+
+###############################################################################
+# Protocol assertions
+#
+# Usage :
+#
+#    protocol = ProtocolChecker("protocol", phaseManager, dut.clk, dut.reset, resetActiveLevel=RESET_ACTIVE_LEVEL.HIGH)
+#    protocol.addStream("io_push", pushStream)
+#    protocol.addAhbLite3("ahb", ahb)
+#    protocol.addAxi4("axi", Axi4Shared(dut, "axi"))  # Axi4, Axi4Shared, Axi4ReadOnly or Axi4WriteOnly
+#
+# All the rules of a clock domain are checked by one coroutine, each interface rule read its signals once
+# per cycle and only read the payloads when they matter (stall, fire). With failFast the first violation
+# fail the test, else they are logged and the test fail at PHASE_CHECK_SCORBOARDS.
+#
+class ProtocolChecker(Infrastructure):
+    def __init__(self, name, parent, clk, reset=None, resetActiveLevel=RESET_ACTIVE_LEVEL.DEFAULT, failFast=True):
+        Infrastructure.__init__(self, name, parent)
+        self.clk = clk
+        self.reset = reset
+        self.resetActiveLevel = resetActiveLevel
+        self.failFast = failFast
+        self.rules = []
+        self.cycleCounter = 0
+        self.violationCounter = 0
+        self.fork(self.stim)
+
+    def addRule(self, rule):
+        rule.setChecker(self)
+        self.rules.append(rule)
+        return rule
+
+    def addStream(self, name, stream):
+        return self.addRule(StreamRule(name, stream))
+
+    def addAhbLite3(self, name, ahb):
+        return self.addRule(AhbLite3Rule(name, ahb))
+
+    def addAxi4(self, name, axi):
+        return self.addRule(Axi4Rule(name, axi))
+
+    def violation(self, rule, message):
+        self.violationCounter += 1
+        message = "%s/%s : %s (cycle %d)" % (self.getPath(), rule.name, message, self.cycleCounter)
+        if self.failFast:
+            raise TestFailure(message)
+        cocotb.log.error(message)
+
+    # Run all the rules once, the sampling point being the current clock edge
+    def checkCycle(self):
+        self.cycleCounter += 1
+        for rule in self.rules:
+            rule.check()
+
+    async def stim(self):
+        reset = rawSignal(self.reset) if self.reset != None else None
+        while True:
+            await RisingEdge(self.clk)
+            if reset != None and reset.read() == self.resetActiveLevel:
+                for rule in self.rules:
+                    rule.clear()
+                continue
+            self.checkCycle()
+
+    def getCounters(self):
+        return {"cycles" : self.cycleCounter, "violations" : self.violationCounter}
+
+    def endPhase(self, phase):
+        Infrastructure.endPhase(self, phase)
+        if phase == PHASE_CHECK_SCORBOARDS and self.violationCounter != 0:
+            raise TestFailure("%s : %d protocol violations" % (self.getPath(), self.violationCounter))
+
+
+class ProtocolRule:
+    def __init__(self, name):
+        self.name = name
+        self.checker = None
+
+    def setChecker(self, checker):
+        self.checker = checker
+
+    def check(self):
+        raise NotImplementedError()
+
+    # Called during the reset
+    def clear(self):
+        pass
+
+    def fail(self, message):
+        self.checker.violation(self, message)
+
+
+###############################################################################
+# Valid can't fall and the payload can't change while valid && !ready
+#
+class StreamRule(ProtocolRule):
+    def __init__(self, name, stream):
+        ProtocolRule.__init__(self, name)
+        self.valid = stream.rawValid
+        self.ready = stream.rawReady
+        self.raws = list(stream.payload.nameToRaw.values())
+        self.names = list(stream.payload.nameToRaw)
+        self.stalled = None
+
+    def clear(self):
+        self.stalled = None
+
+    def check(self):
+        self.checkSampled(self.valid.read(), self.ready.read())
+
+    def checkSampled(self, valid, ready):
+        stalled = self.stalled
+        if stalled != None:
+            if valid != 1:
+                self.fail("valid fall without ready")
+            else:
+                for name, raw, value in zip(self.names, self.raws, stalled):
+                    if raw.read() != value:
+                        self.fail("payload %s changed without ready" % name)
+        if valid == 1 and ready == 0:
+            if stalled == None:
+                self.stalled = [raw.read() for raw in self.raws]
+        else:
+            self.stalled = None
+
+
+###############################################################################
+# AHB-Lite master side rules :
+# - Address and control held during the wait states
+# - NONSEQ aligned, SEQ/BUSY only inside a burst, with the burst control and the expected beat address
+# - Fixed length bursts complete (unless an ERROR response), no BUSY after their last beat
+# - INCR bursts don't cross 1 KiB
+#
+class AhbLite3Rule(ProtocolRule):
+    def __init__(self, name, ahb):
+        ProtocolRule.__init__(self, name)
+        self.HREADY = rawSignal(ahb.HREADY)
+        self.HRESP  = rawSignal(ahb.HRESP)
+        self.HTRANS = rawSignal(ahb.HTRANS)
+        self.HADDR  = rawSignal(ahb.HADDR)
+        self.HBURST = rawSignal(ahb.HBURST)
+        self.HSIZE  = rawSignal(ahb.HSIZE)
+        self.HWRITE = rawSignal(ahb.HWRITE)
+        self.dataWidth = len(ahb.HWDATA)
+        self.clear()
+
+    def clear(self):
+        self.held = None
+        self.burst = None # (HBURST, HSIZE, HWRITE) of the ongoing burst
+        self.beats = None
+        self.beat = 0
+        self.addresses = None
+        self.nextAddress = 0
+
+    def check(self):
+        trans = self.HTRANS.read()
+        if trans == 0 and self.burst == None and self.held == None:
+            return
+
+        if self.HRESP.read() == 1:
+            # ERROR response, the master can cancel the remaining beats
+            self.clear()
+            return
+
+        address = self.HADDR.read()
+        if self.held != None:
+            if self.held != (trans, address):
+                self.fail("address phase changed during a wait state, HTRANS=%d HADDR=0x%x => HTRANS=%d HADDR=0x%x" % (self.held + (trans, address)))
+        if self.HREADY.read() == 0:
+            self.held = (trans, address) if trans >= 2 else None
+            return
+        self.held = None
+
+        if trans == 2: # NONSEQ
+            if self.burst != None and self.beats != None:
+                self.fail("burst interrupted after %d/%d beats" % (self.beat, self.beats))
+            hsize = self.HSIZE.read()
+            hburst = self.HBURST.read()
+            if address & ((1 << hsize)-1) != 0:
+                self.fail("unaligned HADDR=0x%x HSIZE=%d" % (address, hsize))
+            kind, beats = AhbLite3Burst(hburst)
+            if beats != None and kind == BURST_INCR and burstCrossBoundary(address, beats << hsize, ONE_KIB):
+                self.fail("INCR burst cross 1 KiB, HADDR=0x%x HBURST=%d HSIZE=%d" % (address, hburst, hsize))
+            self.beats = beats
+            self.beat = 1
+            self.nextAddress = address + (1 << hsize)
+            if beats == 1:
+                self.burst = None
+            else:
+                self.burst = (hburst, hsize, self.HWRITE.read())
+                if beats != None:
+                    self.addresses = burstSequence(address, beats-1, hsize, kind, self.dataWidth)[0]
+        elif trans == 0: # IDLE
+            if self.burst != None and self.beats != None:
+                self.fail("burst interrupted after %d/%d beats" % (self.beat, self.beats))
+            self.burst = None
+        else: # SEQ / BUSY
+            name = "SEQ" if trans == 3 else "BUSY"
+            if self.burst == None:
+                self.fail(name + " outside of a burst")
+                return
+            if (self.HBURST.read(), self.HSIZE.read(), self.HWRITE.read()) != self.burst:
+                self.fail(name + " with a control different from the burst NONSEQ")
+            expected = self.addresses[self.beat] if self.beats != None else self.nextAddress
+            if address != expected:
+                self.fail("%s HADDR=0x%x, expected 0x%x" % (name, address, expected))
+            if trans == 3:
+                if self.beats == None and address % ONE_KIB == 0:
+                    self.fail("INCR burst cross 1 KiB at 0x%x" % address)
+                self.beat += 1
+                self.nextAddress = address + (1 << self.burst[1])
+                if self.beat == self.beats:
+                    self.burst = None
+
+
+###############################################################################
+# AXI4 rules :
+# - The channels are streams (StreamRule)
+# - Commands : size fit the data width, INCR don't cross 4 KiB, WRAP length and alignment, FIXED at most 16 beats, no reserved burst
+# - WLAST on the len+1 beat of each burst (in the AW order, W can come first), RLAST per ID
+# - No R / B without outstanding command for their ID
+#
+class Axi4Rule(ProtocolRule):
+    def __init__(self, name, axi):
+        ProtocolRule.__init__(self, name)
+        self.channels = []
+        for channel in ["arw", "aw", "ar", "w", "r", "b"]:
+            if hasattr(axi, channel):
+                stream = getattr(axi, channel)
+                self.channels.append((channel, stream.rawValid, stream.rawReady, StreamRule(name + "/" + channel, stream), stream.payload.nameToRaw))
+        dataRaw = (axi.w if hasattr(axi, "w") else axi.r).payload.nameToRaw["data"]
+        self.maxSize = log2Up(len(dataRaw) // 8)
+        self.handlers = {"arw" : self.onArw, "aw" : self.onAw, "ar" : self.onAr, "w" : self.onW, "r" : self.onR, "b" : self.onB}
+        self.clear()
+
+    def setChecker(self, checker):
+        ProtocolRule.setChecker(self, checker)
+        for channel in self.channels:
+            channel[3].setChecker(checker)
+
+    def clear(self):
+        for channel in self.channels:
+            channel[3].clear()
+        self.writeLens = deque()
+        self.earlyWriteLens = deque()
+        self.writeBeat = 0
+        self.writePending = {}
+        self.readLens = {}
+        self.readBeats = {}
+
+    def check(self):
+        for channel, valid, ready, streamRule, raws in self.channels:
+            v = valid.read()
+            r = ready.read()
+            streamRule.checkSampled(v, r)
+            if v == 1 and r == 1:
+                self.handlers[channel](raws)
+
+    def onCmd(self, channel, raws):
+        address = raws["addr"].read()
+        length = raws["len"].read()
+        size = raws["size"].read()
+        burst = raws["burst"].read()
+        if size > self.maxSize:
+            self.fail("%s size %d wider than the data bus" % (channel, size))
+        if burst == BURST_INCR and burstCrossBoundary(address & ~((1 << size)-1), (length + 1) << size, FOUR_KIB):
+            self.fail("%s INCR burst cross 4 KiB, addr=0x%x len=%d size=%d" % (channel, address, length, size))
+        elif burst == BURST_WRAP and (length not in (1, 3, 7, 15) or address & ((1 << size)-1) != 0):
+            self.fail("%s illegal WRAP burst, addr=0x%x len=%d size=%d" % (channel, address, length, size))
+        elif burst == BURST_FIXED and length > 15:
+            self.fail("%s FIXED burst longer than 16 beats, len=%d" % (channel, length))
+        elif burst == 3:
+            self.fail("%s reserved burst type" % channel)
+        return raws["hid"].read() if "hid" in raws else 0, length
+
+    def onArw(self, raws):
+        if raws["write"].read():
+            self.onAw(raws)
+        else:
+            self.onAr(raws)
+
+    def onAw(self, raws):
+        hid, length = self.onCmd("aw", raws)
+        self.writePending[hid] = self.writePending.get(hid, 0) + 1
+        if self.earlyWriteLens:
+            self.checkWriteLen(length, self.earlyWriteLens.popleft())
+        else:
+            self.writeLens.append(length)
+
+    def onAr(self, raws):
+        hid, length = self.onCmd("ar", raws)
+        self.readLens.setdefault(hid, deque()).append(length)
+
+    def checkWriteLen(self, length, beats):
+        if beats != length + 1:
+            self.fail("WLAST after %d beats for a len=%d burst" % (beats, length))
+
+    def onW(self, raws):
+        self.writeBeat += 1
+        if raws["last"].read():
+            if self.writeLens:
+                self.checkWriteLen(self.writeLens.popleft(), self.writeBeat)
+            else:
+                self.earlyWriteLens.append(self.writeBeat)
+            self.writeBeat = 0
+        elif self.writeLens and self.writeBeat == self.writeLens[0] + 1:
+            self.fail("missing WLAST on the beat %d of a len=%d burst" % (self.writeBeat, self.writeLens[0]))
+
+    def onR(self, raws):
+        hid = raws["hid"].read() if "hid" in raws else 0
+        lens = self.readLens.get(hid)
+        if not lens:
+            self.fail("R without outstanding read for ID %d" % hid)
+            return
+        beats = self.readBeats.get(hid, 0) + 1
+        if raws["last"].read():
+            if beats != lens[0] + 1:
+                self.fail("RLAST after %d beats for a len=%d burst, ID %d" % (beats, lens[0], hid))
+            lens.popleft()
+            beats = 0
+        elif beats == lens[0] + 1:
+            self.fail("missing RLAST on the beat %d of a len=%d burst, ID %d" % (beats, lens[0], hid))
+        self.readBeats[hid] = beats
+
+    def onB(self, raws):
+        hid = raws["hid"].read() if "hid" in raws else 0
+        pending = self.writePending.get(hid, 0)
+        if pending == 0:
+            self.fail("B without outstanding write for ID %d" % hid)
+            return
+        self.writePending[hid] = pending - 1
@@ -0,0 +1,131 @@
+import multiprocessing
+import os
+import queue
+import sys
+import traceback
+
+from cocotb.result import TestFailure
+from cocotb.triggers import ClockCycles
+
+from cocotblib.Phase import Infrastructure, PHASE_WAIT_TASKS_END, PHASE_DONE
+
+
+# Send back the results of each batch, or the traceback as a string when the model fails
+def _refModelWorker(modelFactory, inputs, outputs):
+    try:
+        model = modelFactory()
+        while True:
+            batch = inputs.get()
+            if batch == None:
+                break
+            outputs.put([(tag, model(value)) for tag, value in batch])
+    except BaseException:
+        outputs.put(traceback.format_exc())
+
+
+# The simulator embedding Python, sys.executable isn't always an interpreter able to run the worker
+def _pythonExecutable():
+    if os.path.basename(sys.executable).startswith("python"):
+        return sys.executable
+    return os.path.join(sys.exec_prefix, "bin", "python3")
+
+
+###############################################################################
+# Reference model running in a worker process, in parallel of the simulation
+#
+# Usage :
+#
+#    # modelFactory is called in the worker, it has to be a picklable top level callable
+#    refModel = RefModelProcess("refModel", tester, FirModel, lambda ref, tag: scoreboard.refPush(ref), dut.clk)
+#    monitor callback => refModel.submit(inputTransaction)
+#
+# Inputs are sent by batches of batchSize (or every pollPeriod cycles), results come back in submission order
+# and are given to onResult(result, tag) from a coroutine polling them every pollPeriod cycles.
+# Inputs, results and tags have to be picklable.
+# A model exception, or the worker dying, fails the test with the worker traceback / exit code.
+# stop() also shut down the worker. resume() re-forks the polling coroutine from its start, instead of continuing it,
+# which is harmless as it keeps no state.
+#
+class RefModelProcess(Infrastructure):
+    def __init__(self, name, parent, modelFactory, onResult, clk, batchSize=64, pollPeriod=16, executable=None):
+        Infrastructure.__init__(self, name, parent)
+        self.onResult = onResult
+        self.clk = clk
+        self.batchSize = batchSize
+        self.pollPeriod = pollPeriod
+        self.batch = []
+        self.pendingCounter = 0
+        self.resultCounter = 0
+        self.workerStopped = False
+
+        # Forking the simulator process isn't safe, the worker start from a fresh interpreter
+        context = multiprocessing.get_context("spawn")
+        context.set_executable(executable if executable != None else _pythonExecutable())
+        self.inputs = context.Queue()
+        self.outputs = context.Queue()
+        self.process = context.Process(target=_refModelWorker, args=(modelFactory, self.inputs, self.outputs), daemon=True)
+        self.process.start()
+        self.fork(self.stim)
+
+    def submit(self, value, tag=None):
+        self.batch.append((tag, value))
+        self.pendingCounter += 1
+        if len(self.batch) >= self.batchSize:
+            self.flush()
+
+    def flush(self):
+        if len(self.batch) != 0:
+            self.inputs.put(self.batch)
+            self.batch = []
+
+    # Give the available results to onResult, block until all of them are back (or the worker is dead) if wait
+    def drain(self, wait=False):
+        while self.pendingCounter != 0:
+            try:
+                results = self.outputs.get(block=wait, timeout=1.0 if wait else None)
+            except queue.Empty:
+                if wait and self.process.is_alive():
+                    continue
+                break
+            if isinstance(results, str):
+                raise TestFailure("%s : the reference model failed in the worker\n%s" % (self.getPath(), results))
+            for tag, result in results:
+                self.pendingCounter -= 1
+                self.resultCounter += 1
+                self.onResult(result, tag)
+
+    async def stim(self):
+        while not self.workerStopped:
+            await ClockCycles(self.clk, self.pollPeriod)
+            self.flush()
+            self.drain()
+            if not self.workerStopped and not self.process.is_alive():
+                self.drain(wait=True) # Results or traceback still in the pipe
+                raise TestFailure("%s : the reference model worker died (exit code %s) with %d pending results" % (self.getPath(), self.process.exitcode, self.pendingCounter))
+
+    def canPhaseProgress(self, phase):
+        if phase == PHASE_WAIT_TASKS_END and self.pendingCounter != 0:
+            return False
+        return Infrastructure.canPhaseProgress(self, phase)
+
+    def getCounters(self):
+        return {"results" : self.resultCounter, "pending" : self.pendingCounter}
+
+    def stopWorker(self, timeout=10.0):
+        self.workerStopped = True
+        if self.process.is_alive():
+            self.inputs.put(None)
+            self.process.join(timeout)
+            if self.process.is_alive():
+                self.process.terminate()
+                self.process.join()
+
+    # override, the worker can't be restarted, a pause only suspend the polling coroutine
+    def stop(self):
+        self.stopWorker()
+        Infrastructure.stop(self)
+
+    def startPhase(self, phase):
+        Infrastructure.startPhase(self, phase)
+        if phase == PHASE_DONE:
+            self.stopWorker()
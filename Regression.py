@@ -0,0 +1,381 @@
+import glob
+import hashlib
+import importlib.util
+import itertools
+import json
+import os
+import shutil
+import subprocess
+import threading
+import time
+import xml.etree.ElementTree as ET
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from cocotblib.Metrics import METRICS_ENV
+from cocotblib.Phase import REPORT_ENV, PHASE_DONE
+
+
+###############################################################################
+# One simulator invocation of the regression matrix
+#
+class RegressionRun:
+    def __init__(self, index, seed, params):
+        self.index = index
+        self.seed = seed
+        self.params = params
+        self.passed = None       # None => not run (skipped by stopOnFailure)
+        self.returnCode = None
+        self.wallTime = 0.0
+        self.simTime = None
+        self.cycles = None
+        self.counters = {}
+        self.failures = []
+        self.runDir = None
+        self.cached = False      # Result replayed from the RegressionCache
+
+    def getName(self):
+        name = "seed%d" % self.seed
+        for key in sorted(self.params):
+            name += "_%s%s" % (key, self.params[key])
+        return name
+
+    def toDict(self):
+        return {
+            "name"       : self.getName(),
+            "seed"       : self.seed,
+            "params"     : self.params,
+            "passed"     : self.passed,
+            "returnCode" : self.returnCode,
+            "wallTime"   : self.wallTime,
+            "simTime"    : self.simTime,
+            "cycles"     : self.cycles,
+            "counters"   : self.counters,
+            "failures"   : self.failures,
+            "runDir"     : self.runDir,
+            "cached"     : self.cached
+        }
+
+    def fromDict(self, data):
+        self.passed = data["passed"]
+        self.returnCode = data["returnCode"]
+        self.wallTime = data["wallTime"]
+        self.simTime = data["simTime"]
+        self.cycles = data["cycles"]
+        self.counters = data["counters"]
+        self.failures = data["failures"]
+
+
+###############################################################################
+# Local store of the regression run results, keyed on what can change them
+#
+# Usage :
+#
+#    cache = RegressionCache("~/.cache/myRegression", designFiles=["rtl", "sim_build/sim.vvp"], modules=["myTestbench"])
+#    regression = Regression(["make", "sim"], seeds=range(64), cache=cache)
+#
+#    cache.inheritedEnv.append("VERILATOR_ROOT")
+#
+# The key of a run is the fingerprint of :
+# - designFiles : files, directories (recursively) or glob patterns, typically the HDL sources and the elaborated simulator.
+#   Required, without them an RTL change would replay stale results
+# - modules : names or module objects of the testbench python code, a package is taken with all its .py files.
+#   cocotblib itself is always part of it
+# - the command, the seed, the parameters, the regression env and the inheritedEnv variables of os.environ.
+#   The rest of os.environ isn't part of it (CI builds ids, hostnames, ... would change the key of every build),
+#   add to inheritedEnv the variables changing the simulation (tools paths, simulator options, ...)
+#
+# On a hit the stored pass/fail, report counters, metrics and logs are replayed into the run directory
+# without running the simulator. Timed out runs and runs killed by stopOnFailure are never stored.
+#
+class RegressionCache:
+    STORED_FILES = ["report.json", "results.xml", "metrics.jsonl", "sim.log"]
+    INHERITED_ENV = ["SIM", "TOPLEVEL_LANG", "PYTHONPATH"]
+
+    def __init__(self, cacheDir, designFiles, modules=(), cacheFailures=True, inheritedEnv=INHERITED_ENV):
+        self.designFiles = list(designFiles)
+        if len(self.designFiles) == 0:
+            raise Exception("RegressionCache needs the designFiles, the key would ignore the design")
+        self.cacheDir = os.path.abspath(os.path.expanduser(cacheDir))
+        self.modules = list(modules)
+        self.cacheFailures = cacheFailures
+        self.inheritedEnv = list(inheritedEnv)
+        self.fingerprint = None
+
+    def getSourceFiles(self):
+        files = []
+        for pattern in self.designFiles:
+            for path in sorted(glob.glob(os.path.expanduser(pattern))) or [pattern]:
+                files.extend(self._walk(path))
+        modules = [os.path.dirname(os.path.abspath(__file__))]
+        for module in self.modules:
+            if isinstance(module, str):
+                spec = importlib.util.find_spec(module)
+                if spec == None or spec.origin == None:
+                    raise Exception("RegressionCache can't find the %s module" % module)
+                origin = spec.origin
+            else:
+                origin = module.__file__
+            if os.path.basename(origin) == "__init__.py":
+                origin = os.path.dirname(origin)
+            modules.append(origin)
+        for path in modules:
+            files.extend(file for file in self._walk(path) if file.endswith(".py"))
+        return sorted(set(os.path.abspath(file) for file in files))
+
+    def _walk(self, path):
+        if not os.path.exists(path):
+            raise Exception("RegressionCache source %s doesn't exist" % path)
+        if os.path.isfile(path):
+            return [path]
+        files = []
+        for root, dirs, names in os.walk(path):
+            dirs[:] = [d for d in dirs if d != "__pycache__" and not d.startswith(".")]
+            files.extend(os.path.join(root, name) for name in names)
+        return files
+
+    # Hash of all the source files content, done once per regression
+    def computeFingerprint(self):
+        digest = hashlib.sha256()
+        for path in self.getSourceFiles():
+            digest.update(path.encode() + b"\0")
+            with open(path, "rb") as f:
+                for block in iter(lambda: f.read(1 << 20), b""):
+                    digest.update(block)
+            digest.update(b"\0")
+        self.fingerprint = digest.hexdigest()
+        return self.fingerprint
+
+    def getKey(self, command, env, seed, params):
+        if self.fingerprint == None:
+            self.computeFingerprint()
+        run = json.dumps({
+            "fingerprint" : self.fingerprint,
+            "command"     : command,
+            "env"         : dict({k : os.environ[k] for k in self.inheritedEnv if k in os.environ}, **env),
+            "seed"        : seed,
+            "params"      : params
+        }, sort_keys=True, default=str)
+        return hashlib.sha256(run.encode()).hexdigest()
+
+    def _entryDir(self, key):
+        return os.path.join(self.cacheDir, key[:2], key)
+
+    # Replay a stored result into run, return False on a miss
+    def load(self, key, run):
+        entryDir = self._entryDir(key)
+        resultPath = os.path.join(entryDir, "result.json")
+        if not os.path.exists(resultPath):
+            return False
+        with open(resultPath) as f:
+            run.fromDict(json.load(f))
+        for name in self.STORED_FILES:
+            path = os.path.join(entryDir, name)
+            if os.path.exists(path):
+                shutil.copyfile(path, os.path.join(run.runDir, name))
+        run.cached = True
+        return True
+
+    def store(self, key, run):
+        if run.passed == None or (not run.passed and not self.cacheFailures) or "Wall time timeout" in run.failures:
+            return
+        entryDir = self._entryDir(key)
+        # Built aside then renamed, concurrent regressions never see a partial entry
+        tmpDir = entryDir + ".tmp%d_%d" % (os.getpid(), threading.get_ident())
+        os.makedirs(tmpDir, exist_ok=True)
+        for name in self.STORED_FILES:
+            path = os.path.join(run.runDir, name)
+            if os.path.exists(path):
+                shutil.copyfile(path, os.path.join(tmpDir, name))
+        with open(os.path.join(tmpDir, "result.json"), "w") as f:
+            json.dump(run.toDict(), f, indent=2)
+        try:
+            os.rename(tmpDir, entryDir)
+        except OSError:
+            shutil.rmtree(tmpDir, ignore_errors=True) # Already stored by someone else
+
+    def clear(self):
+        shutil.rmtree(self.cacheDir, ignore_errors=True)
+
+
+###############################################################################
+# Run a PhaseManager based testbench over a seed/parameter matrix
+#
+# Usage :
+#
+#    regression = Regression(["make", "SIM=ghdl", "sim"], seeds=range(64), params={"TESTCASE" : ["testA", "testB"]})
+#    regression.run()
+#    print(regression.getSummary())
+#
+# Each run gets its own directory, RANDOM_SEED / parameters as environment variables, and the
+# PhaseManager report and cocotb results file are collected from it (the metrics are exported in it). The command arguments can
+# use the {seed}, {runDir} and parameter names as format fields.
+#
+# The simulator has to be already elaborated, the command is expected to only run the simulation.
+# A run which can't be launched, or whose report / results file can't be read, fails with the error.
+# With stopOnFailure, the runs killed by the first failure fail too, only the ones never started are skipped.
+# With a RegressionCache, the runs whose design, testbench, seed and parameters didn't change are replayed instead of run.
+#
+class Regression:
+    def __init__(self, command, seeds, params=None, workDir="regression", jobs=None, stopOnFailure=False, env=None, cwd=None, timeout=None, cache=None):
+        self.command = command
+        self.seeds = list(seeds)
+        self.params = params if params != None else {}
+        self.workDir = os.path.abspath(workDir)
+        self.jobs = jobs if jobs != None else (os.cpu_count() or 1)
+        self.stopOnFailure = stopOnFailure
+        self.env = env if env != None else {}
+        self.cwd = cwd
+        self.timeout = timeout
+        self.cache = cache
+        self.runs = []
+        self.wallTime = 0.0
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._processes = []
+        self._killed = set()
+
+    def getMatrix(self):
+        keys = sorted(self.params)
+        runs = []
+        for seed in self.seeds:
+            for values in itertools.product(*[self.params[k] for k in keys]):
+                runs.append(RegressionRun(len(runs), seed, dict(zip(keys, values))))
+        return runs
+
+    def run(self):
+        self.runs = self.getMatrix()
+        os.makedirs(self.workDir, exist_ok=True)
+        startTime = time.time()
+        if self.cache != None:
+            self.cache.computeFingerprint()
+        # Threads are enough there, the simulation itself happens in the child processes
+        with ThreadPoolExecutor(max_workers=self.jobs) as pool:
+            futures = {pool.submit(self._launch, run) : run for run in self.runs}
+            for future in as_completed(futures):
+                try:
+                    future.result()
+                except Exception as e:
+                    run = futures[future]
+                    run.passed = False
+                    run.failures.append("Regression error : %s: %s" % (type(e).__name__, e))
+                    if self.stopOnFailure:
+                        self.stop()
+        self.wallTime = time.time() - startTime
+        self.writeReport(os.path.join(self.workDir, "report.json"))
+        return self.isSuccess()
+
+    def stop(self):
+        self._stop.set()
+        with self._lock:
+            for process in self._processes:
+                if process.poll() == None:
+                    process.kill()
+                    self._killed.add(process)
+
+    def _launch(self, run):
+        if self._stop.is_set():
+            return
+        run.runDir = os.path.join(self.workDir, run.getName())
+        os.makedirs(run.runDir, exist_ok=True)
+        reportPath  = os.path.join(run.runDir, "report.json")
+        resultsPath = os.path.join(run.runDir, "results.xml")
+        metricsPath = os.path.join(run.runDir, "metrics.jsonl")
+        for path in [reportPath, resultsPath, metricsPath]:
+            if os.path.exists(path):
+                os.remove(path)
+
+        env = dict(os.environ)
+        env.update(self.env)
+        env.update({k : str(v) for k, v in run.params.items()})
+        env["RANDOM_SEED"] = str(run.seed)
+
+        cacheKey = None
+        if self.cache != None:
+            # {runDir} is the same for a given run name, keep the unformatted command in the key
+            cacheKey = self.cache.getKey(self.command, self.env, run.seed, run.params)
+            if self.cache.load(cacheKey, run):
+                if not run.passed and self.stopOnFailure:
+                    self.stop()
+                return
+
+        fields = dict(run.params, seed=run.seed, runDir=run.runDir)
+        command = [arg.format(**fields) for arg in self.command]
+        env["COCOTB_RESULTS_FILE"] = resultsPath
+        env[REPORT_ENV] = reportPath
+        env.setdefault(METRICS_ENV, metricsPath)
+
+        startTime = time.time()
+        with open(os.path.join(run.runDir, "sim.log"), "w") as log:
+            process = subprocess.Popen(command, cwd=self.cwd, env=env, stdout=log, stderr=subprocess.STDOUT)
+            with self._lock:
+                self._processes.append(process)
+            try:
+                run.returnCode = process.wait(timeout=self.timeout)
+            except subprocess.TimeoutExpired:
+                process.kill()
+                run.returnCode = process.wait()
+                run.failures.append("Wall time timeout")
+            with self._lock:
+                self._processes.remove(process)
+                killed = process in self._killed
+        run.wallTime = time.time() - startTime
+
+        if killed:
+            # Not a result of its own, never cached
+            run.passed = False
+            run.failures.append("Killed by the stopOnFailure of an other run")
+            return
+
+        self._readReport(run, reportPath)
+        self._readResults(run, resultsPath)
+        run.passed = run.returnCode == 0 and len(run.failures) == 0
+        if cacheKey != None:
+            self.cache.store(cacheKey, run)
+        if not run.passed and self.stopOnFailure:
+            self.stop()
+
+    def _readReport(self, run, path):
+        if not os.path.exists(path):
+            run.failures.append("No PhaseManager report")
+            return
+        with open(path) as f:
+            report = json.load(f)
+        run.simTime = report["simTime"]
+        run.cycles = report["cycles"]
+        run.counters = report["counters"]
+        if report["phase"] != PHASE_DONE:
+            run.failures.append("PhaseManager stopped in phase %d" % report["phase"])
+
+    def _readResults(self, run, path):
+        if not os.path.exists(path):
+            run.failures.append("No cocotb results file")
+            return
+        for testcase in ET.parse(path).getroot().iter("testcase"):
+            for failure in list(testcase.iter("failure")) + list(testcase.iter("error")):
+                run.failures.append("%s : %s" % (testcase.get("name"), failure.get("message", failure.tag)))
+
+    def isSuccess(self):
+        return all(run.passed == True for run in self.runs)
+
+    def writeReport(self, path):
+        with open(path, "w") as f:
+            json.dump({
+                "wallTime" : self.wallTime,
+                "jobs"     : self.jobs,
+                "cached"   : sum(1 for run in self.runs if run.cached),
+                "runs"     : [run.toDict() for run in self.runs]
+            }, f, indent=2)
+
+    def getSummary(self):
+        passed  = [run for run in self.runs if run.passed == True]
+        failed  = [run for run in self.runs if run.passed == False]
+        skipped = [run for run in self.runs if run.passed == None]
+        cached  = [run for run in self.runs if run.cached]
+        buffer = "Regression : %d passed, %d failed, %d skipped in %.1fs\n" % (len(passed), len(failed), len(skipped), self.wallTime)
+        if self.cache != None:
+            buffer += "    %d replayed from the cache\n" % len(cached)
+        for run in failed:
+            buffer += "FAIL %s (%s)\n" % (run.getName(), run.runDir)
+            for failure in run.failures:
+                buffer += "    %s\n" % failure
+        return buffer
@@ -1,4 +1,8 @@
-from queue import Queue
+import itertools
+import os
+import pickle
+import tempfile
+from collections import deque
 
 import cocotb
 from cocotb.result import TestFailure
@@ -6,13 +10,120 @@ from cocotb.result import TestFailure
 from cocotblib.Phase import Infrastructure, PHASE_CHECK_SCORBOARDS
 
 
+###############################################################################
+# FIFO which keep at most memoryLimit elements in memory, the overflow is pickled into a temporary file
+#
+# It keeps the queue.Queue qsize() and queue used by the testbenches on the scoreboard refs / uuts. Reading queue
+# loads back all the spilled elements into memory, to give the whole FIFO as a deque.
+#
+def checkMemoryLimit(memoryLimit):
+    if memoryLimit != None and memoryLimit < 1:
+        raise Exception("Scoreboard memoryLimit has to be None or at least 1, not %s" % memoryLimit)
+
+class SpillQueue:
+    def __init__(self, memoryLimit=None):
+        checkMemoryLimit(memoryLimit)
+        self.memoryLimit = memoryLimit
+        self.memory = deque()
+        self.spillFile = None
+        self.spillCount = 0
+        self.spillReadPos = 0
+
+    def put(self, e):
+        if self.spillCount == 0 and (self.memoryLimit == None or len(self.memory) < self.memoryLimit):
+            self.memory.append(e)
+        else:
+            if self.spillFile == None:
+                self.spillFile = tempfile.TemporaryFile()
+            self.spillFile.seek(0, os.SEEK_END)
+            pickle.dump(e, self.spillFile, pickle.HIGHEST_PROTOCOL)
+            self.spillCount += 1
+
+    def get(self):
+        e = self.memory.popleft()
+        if self.spillCount != 0 and len(self.memory) <= self.memoryLimit // 2:
+            self.unspill(self.memoryLimit - len(self.memory))
+        return e
+
+    def unspill(self, count):
+        self.spillFile.seek(self.spillReadPos)
+        for i in range(min(count, self.spillCount)):
+            self.memory.append(pickle.load(self.spillFile))
+            self.spillCount -= 1
+        self.spillReadPos = self.spillFile.tell()
+        if self.spillCount == 0:
+            self.spillFile.seek(0)
+            self.spillFile.truncate()
+            self.spillReadPos = 0
+
+    def empty(self):
+        return len(self.memory) == 0
+
+    def qsize(self):
+        return len(self)
+
+    @property
+    def queue(self):
+        if self.spillCount != 0:
+            self.unspill(self.spillCount)
+        return self.memory
+
+    def __len__(self):
+        return len(self.memory) + self.spillCount
+
+    # Iterate without consuming
+    def __iter__(self):
+        for e in list(self.memory):
+            yield e
+        if self.spillCount != 0:
+            self.spillFile.seek(self.spillReadPos)
+            for i in range(self.spillCount):
+                yield pickle.load(self.spillFile)
+
+
+def _remainingTransactions(remaining):
+    for tag, queues in remaining:
+        for queue in queues:
+            for e in queue:
+                yield tag, e
+
+###############################################################################
+# Log a bounded summary of the remaining transactions of a scoreboard, the full list is streamed into a file
+#
+# @param remaining : list of (tag, list of SpillQueue)
+def logRemainingTransactions(scoreboard, remaining):
+    total = 0
+    counts = []
+    for tag, queues in remaining:
+        count = sum(len(queue) for queue in queues)
+        total += count
+        counts.append("%d %s" % (count, tag))
+    error = scoreboard.getPath() + " has some remaining transaction (%s) :\n" % ", ".join(counts)
+    for tag, e in itertools.islice(_remainingTransactions(remaining), scoreboard.reportSummaryLimit):
+        error += tag + ":\n" + str(e) + "\n"
+
+    if total > scoreboard.reportSummaryLimit:
+        path = os.path.join(scoreboard.reportDir, scoreboard.getPath().replace("/", "_") + "_remaining.txt")
+        with open(path, "w") as f:
+            for tag, e in _remainingTransactions(remaining):
+                f.write(tag + ":\n")
+                f.write(str(e))
+                f.write("\n")
+        error += "... %d more, full list in %s\n" % (total - scoreboard.reportSummaryLimit, path)
+
+    cocotb.log.error(error)
+
+
 class ScorboardInOrder(Infrastructure):
-    def __init__(self,name,parent):
+    def __init__(self,name,parent,memoryLimit=None):
         Infrastructure.__init__(self,name,parent)
-        self.refs = Queue()
-        self.uuts = Queue()
+        self.refs = SpillQueue(memoryLimit)
+        self.uuts = SpillQueue(memoryLimit)
+        self.reportSummaryLimit = 16
+        self.reportDir = "."
         self.refsCounter = 0
         self.uutsCounter = 0
+        self.matchCounter = 0
 
     def refPush(self,ref):
         self.refs.put(ref)
@@ -29,6 +140,7 @@ class ScorboardInOrder(Infrastructure):
             ref = self.refs.get()
             uut = self.uuts.get()
 
+            self.matchCounter += 1
             self.match(uut,ref)
 
 
@@ -37,18 +149,18 @@ class ScorboardInOrder(Infrastructure):
             cocotb.log.error("Missmatch detected in " + self.getPath())
             uut.assertEqualRef(ref)
 
+    def getPendingCount(self):
+        return len(self.refs), len(self.uuts)
+
+    def getCounters(self):
+        refs, uuts = self.getPendingCount()
+        return {"refs" : self.refsCounter, "uuts" : self.uutsCounter, "matches" : self.matchCounter, "pendingRefs" : refs, "pendingUuts" : uuts}
+
     def startPhase(self, phase):
         Infrastructure.startPhase(self, phase)
         if phase == PHASE_CHECK_SCORBOARDS:
             if (not self.refs.empty()) or (not self.uuts.empty()):
-                error = self.getPath() + " has some remaining transaction :\n"
-                for e in self.refs.queue:
-                    error += "REF:\n" + str(e) + "\n"
-
-                for e in self.uuts.queue:
-                    error += "UUT:\n" + str(e) + "\n"
-
-                cocotb.log.error(error)
+                logRemainingTransactions(self, [("REF", [self.refs]), ("UUT", [self.uuts])])
 
 
     def endPhase(self, phase):
@@ -59,26 +171,34 @@ class ScorboardInOrder(Infrastructure):
 
 
 class ScorboardOutOfOrder(Infrastructure):
-    def __init__(self,name,parent):
+    def __init__(self,name,parent,memoryLimit=None):
         Infrastructure.__init__(self,name,parent)
         self.refsDic = {}
         self.uutsDic = {}
+        checkMemoryLimit(memoryLimit)
+        self.memoryLimit = memoryLimit # per oooid
+        self.reportSummaryLimit = 16
+        self.reportDir = "."
         self.listeners = []
-
+        self.refsCounter = 0
+        self.uutsCounter = 0
+        self.matchCounter = 0
 
     def addListener(self,func):
         self.listeners.append(func)
 
     def refPush(self,ref,oooid):
         if oooid not in self.refsDic:
-            self.refsDic[oooid] = Queue()
+            self.refsDic[oooid] = SpillQueue(self.memoryLimit)
         self.refsDic[oooid].put(ref)
+        self.refsCounter += 1
         self.update(oooid)
 
     def uutPush(self, uut, oooid):
         if oooid not in self.uutsDic:
-            self.uutsDic[oooid] = Queue()
+            self.uutsDic[oooid] = SpillQueue(self.memoryLimit)
         self.uutsDic[oooid].put(uut)
+        self.uutsCounter += 1
         self.update(oooid)
 
     def update(self,oooid):
@@ -89,6 +209,7 @@ class ScorboardOutOfOrder(Infrastructure):
             ref = refs.get()
             uut = uuts.get()
 
+            self.matchCounter += 1
             self.match(uut,ref)
 
             #Clean
@@ -107,20 +228,18 @@ class ScorboardOutOfOrder(Infrastructure):
             cocotb.log.error("Missmatch detected in " + self.getPath())
             uut.assertEqualRef(ref)
 
+    def getPendingCount(self):
+        return sum(len(q) for q in self.refsDic.values()), sum(len(q) for q in self.uutsDic.values())
+
+    def getCounters(self):
+        refs, uuts = self.getPendingCount()
+        return {"refs" : self.refsCounter, "uuts" : self.uutsCounter, "matches" : self.matchCounter, "pendingRefs" : refs, "pendingUuts" : uuts}
+
     def startPhase(self, phase):
         Infrastructure.startPhase(self, phase)
         if phase == PHASE_CHECK_SCORBOARDS:
             if len(self.refsDic) != 0 or len(self.uutsDic) != 0:
-                error = self.getPath() + " has some remaining transaction :\n"
-                for l in self.refsDic.values():
-                    for e in l.queue:
-                        error += "REF:\n" + str(e) + "\n"
-
-                for l in self.uutsDic.values():
-                    for e in l.queue:
-                        error += "UUT:\n" + str(e) + "\n"
-
-                cocotb.log.error(error)
+                logRemainingTransactions(self, [("REF", list(self.refsDic.values())), ("UUT", list(self.uutsDic.values()))])
 
 
     def endPhase(self, phase):
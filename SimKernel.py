@@ -0,0 +1,742 @@
+import contextlib
+import heapq
+import logging
+import sys
+import types
+from collections import deque
+
+from cocotblib.Burst import burstSequence
+
+
+###############################################################################
+# Pure Python cycle based stand-in of the simulator + cocotb scheduler
+#
+# Usage :
+#
+#    kernel = install()  # Has to be done before importing the cocotblib components
+#    from cocotblib.Stream import Stream, StreamFifoTester
+#
+#    dut = streamFifoDut({"data" : 32}, depth=16)
+#    kernel.fork(ClockDomain(dut.clk, 5, dut.reset, RESET_ACTIVE_LEVEL.HIGH).start())
+#    ...
+#    kernel.run(phaseManager.run())
+#
+# Signals writes (<=) are applied at the end of the current delta, edges wake up their waiters in the next one.
+# An exception raised by any task stops the kernel and is raised by run().
+# Legacy @cocotb.coroutine generators are also accepted : a yielded coroutine is forked and joined, as cocotb do,
+# a yielded list is a First, and ReturnValue gives the task result. The yield of a coroutine gives back the Join,
+# whose retval is the result (the retval of a yielded @cocotb.coroutine object itself is only set by cocotb).
+#
+
+_kernel = None
+
+def getKernel():
+    return _kernel
+
+
+###############################################################################
+# Signal handles
+#
+class SimSignal:
+    def __init__(self, name, width=1, value=0):
+        self._name = name
+        self.width = width
+        self.mask = (1 << width)-1
+        self._value = value & self.mask
+        self._edge = []
+        self._rising = []
+        self._falling = []
+
+    @property
+    def value(self):
+        return self._value
+
+    def setimmediatevalue(self, value):
+        self._value = int(value) & self.mask
+
+    def __le__(self, value):
+        _kernel.pendingWrites[self] = int(value) & self.mask
+
+    def __int__(self):
+        return self._value
+
+    def __len__(self):
+        return self.width
+
+    def __str__(self):
+        return format(self._value, "0%db" % self.width)
+
+    __hash__ = object.__hash__
+
+    def __repr__(self):
+        return "%s=0x%x" % (self._name, self._value)
+
+
+class SimDut:
+    def __init__(self, name="dut"):
+        self._name = name
+        self._signals = {}
+
+    def addSignal(self, name, width=1, value=0):
+        signal = SimSignal(name, width, value)
+        self._signals[name] = signal
+        return signal
+
+    def __getattr__(self, name):
+        signals = self.__dict__["_signals"]
+        if name not in signals:
+            raise AttributeError(name)
+        return signals[name]
+
+    def __iter__(self):
+        return iter(list(self._signals.values()))
+
+
+###############################################################################
+# Triggers
+#
+class Trigger:
+    def __await__(self):
+        return (yield self)
+
+    def _prime(self, kernel, waiter):
+        raise NotImplementedError()
+
+
+class Timer(Trigger):
+    def __init__(self, time, units=None):
+        self.time = time
+
+    def _prime(self, kernel, waiter):
+        kernel.seq += 1
+        heapq.heappush(kernel.timers, (kernel.time + self.time, kernel.seq, waiter, self))
+
+
+class ReadOnly(Trigger):
+    def _prime(self, kernel, waiter):
+        kernel.readOnly.append((waiter, self))
+
+
+class Edge(Trigger):
+    def __init__(self, signal):
+        self.signal = signal
+
+    def _prime(self, kernel, waiter):
+        self.signal._edge.append((waiter, self))
+
+
+class RisingEdge(Edge):
+    def _prime(self, kernel, waiter):
+        self.signal._rising.append((waiter, self))
+
+
+class FallingEdge(Edge):
+    def _prime(self, kernel, waiter):
+        self.signal._falling.append((waiter, self))
+
+
+class _CyclesCounter:
+    def __init__(self, waiter, trigger, count):
+        self.waiter = waiter
+        self.trigger = trigger
+        self.count = count
+
+    def _waits(self, trigger):
+        return self.waiter._waits(self.trigger)
+
+    def _wake(self, edge, result=None):
+        if not self.waiter._waits(self.trigger):
+            return
+        self.count -= 1
+        if self.count == 0:
+            self.waiter._wake(self.trigger)
+        else:
+            self.trigger._register(self)
+
+
+class ClockCycles(Trigger):
+    def __init__(self, signal, num_cycles, rising=True):
+        self.signal = signal
+        self.num_cycles = num_cycles
+        self.rising = rising
+
+    def _register(self, counter):
+        (self.signal._rising if self.rising else self.signal._falling).append((counter, self))
+
+    def _prime(self, kernel, waiter):
+        if self.num_cycles <= 0:
+            kernel.ready.append((waiter, self))
+        else:
+            self._register(_CyclesCounter(waiter, self, self.num_cycles))
+
+
+class _FirstWaiter:
+    def __init__(self, waiter, first):
+        self.waiter = waiter
+        self.first = first
+
+    def _waits(self, trigger):
+        return self.waiter._waits(self.first)
+
+    def _wake(self, trigger, result=None):
+        self.waiter._wake(self.first, trigger)
+
+
+class First(Trigger):
+    def __init__(self, *triggers):
+        self.triggers = triggers
+
+    def _prime(self, kernel, waiter):
+        firstWaiter = _FirstWaiter(waiter, self)
+        for trigger in self.triggers:
+            trigger._prime(kernel, firstWaiter)
+
+
+class Join(Trigger):
+    def __init__(self, task):
+        self.task = task
+
+    # Result of the joined task, as cocotb Join do
+    @property
+    def retval(self):
+        return self.task.result()
+
+    def _prime(self, kernel, waiter):
+        if self.task._done:
+            kernel.ready.append((waiter, self))
+        else:
+            self.task._joiners.append((waiter, self))
+
+
+class _EventTrigger(Trigger):
+    def __init__(self, event):
+        self.event = event
+
+    def _prime(self, kernel, waiter):
+        if self.event.fired:
+            kernel.ready.append((waiter, self))
+        else:
+            self.event._waiters.append((waiter, self))
+
+
+class Event:
+    def __init__(self, name=None):
+        self.name = name
+        self.data = None
+        self.fired = False
+        self._waiters = []
+
+    def set(self, data=None):
+        self.fired = True
+        self.data = data
+        waiters = self._waiters
+        self._waiters = []
+        for waiter, trigger in waiters:
+            waiter._wake(trigger)
+
+    def wait(self):
+        return _EventTrigger(self)
+
+    def clear(self):
+        self.fired = False
+
+    def is_set(self):
+        return self.fired
+
+
+###############################################################################
+# Forked coroutine
+#
+class Task:
+    def __init__(self, kernel, coroutine):
+        self.kernel = kernel
+        self.coroutine = coroutine
+        self._trigger = None
+        self._done = False
+        self._result = None
+        self._joiners = []
+
+    def _waits(self, trigger):
+        return self._trigger is trigger
+
+    def _wake(self, trigger, result=None):
+        if self._trigger is trigger:
+            self._trigger = None
+            self.kernel.ready.append((self, trigger if result == None else result))
+
+    def _resume(self, value):
+        if self._done:
+            return
+        try:
+            trigger = self.coroutine.send(value)
+        except StopIteration as e:
+            self._finish(e.value)
+            return
+        except ReturnValue as e:
+            self._finish(e.retval)
+            return
+        except BaseException as e:
+            self._finish(None)
+            self.kernel.fail(e)
+            return
+        if self._done:
+            return # killed itself
+        if isinstance(trigger, Task):
+            trigger = Join(trigger)
+        elif isinstance(trigger, list):
+            trigger = First(*trigger)
+        elif not isinstance(trigger, Trigger):
+            trigger = Join(self.kernel.fork(trigger))
+        self._trigger = trigger
+        trigger._prime(self.kernel, self)
+
+    def _finish(self, result):
+        self._done = True
+        self._result = result
+        for waiter, trigger in self._joiners:
+            waiter._wake(trigger)
+        self._joiners = []
+
+    def kill(self):
+        if self._done:
+            return
+        self._trigger = None
+        self._done = True
+        try:
+            self.coroutine.close()
+        except ValueError:
+            pass # killing itself
+
+    def join(self):
+        return Join(self)
+
+    def done(self):
+        return self._done
+
+    def result(self):
+        return self._result
+
+    @property
+    def retval(self):
+        return self._result
+
+    def __await__(self):
+        yield Join(self)
+        return self._result
+
+
+###############################################################################
+# Scheduler
+#
+class SimKernel:
+    def __init__(self):
+        self.time = 0
+        self.seq = 0
+        self.timers = []
+        self.ready = deque()
+        self.readOnly = []
+        self.pendingWrites = {}
+        self.failure = None
+        self.deltaCounter = 0
+
+    def fork(self, coroutine):
+        task = Task(self, coroutine)
+        self.ready.append((task, None))
+        return task
+
+    def fail(self, exception):
+        if self.failure == None:
+            self.failure = exception
+
+    def getSimTime(self, units="step"):
+        return self.time
+
+    def _fire(self, waiters):
+        for waiter, trigger in waiters:
+            waiter._wake(trigger)
+
+    def _applyWrites(self):
+        writes = self.pendingWrites
+        self.pendingWrites = {}
+        for signal, value in writes.items():
+            old = signal._value
+            if old == value:
+                continue
+            signal._value = value
+            if len(signal._edge) != 0:
+                waiters = signal._edge
+                signal._edge = []
+                self._fire(waiters)
+            if (value & 1) != (old & 1):
+                if value & 1:
+                    if len(signal._rising) != 0:
+                        waiters = signal._rising
+                        signal._rising = []
+                        self._fire(waiters)
+                elif len(signal._falling) != 0:
+                    waiters = signal._falling
+                    signal._falling = []
+                    self._fire(waiters)
+
+    # Run everything which happen at the current time
+    def _settle(self):
+        ready = self.ready
+        while True:
+            while len(ready) != 0:
+                task, value = ready.popleft()
+                if isinstance(task, Task):
+                    task._resume(value)
+                else:
+                    task._wake(value)
+                if self.failure != None:
+                    return
+            if len(self.pendingWrites) != 0:
+                self.deltaCounter += 1
+                self._applyWrites()
+            elif len(self.readOnly) != 0:
+                waiters = self.readOnly
+                self.readOnly = []
+                self._fire(waiters)
+            else:
+                break
+
+    ##########################################################################
+    # Run until the coroutine is done (or until there is nothing left to do / the until time is reached)
+    def run(self, coroutine=None, until=None):
+        main = self.fork(coroutine) if coroutine != None else None
+        timers = self.timers
+        while True:
+            self._settle()
+            if self.failure != None:
+                failure = self.failure
+                self.failure = None
+                raise failure
+            if main != None and main._done:
+                return main._result
+            if len(timers) == 0 or (until != None and timers[0][0] > until):
+                return None
+            self.time = timers[0][0]
+            while len(timers) != 0 and timers[0][0] == self.time:
+                time, seq, waiter, trigger = heapq.heappop(timers)
+                waiter._wake(trigger)
+
+
+###############################################################################
+# Install the kernel as the cocotb implementation used by the library
+#
+# uninstall() restores cocotb and unloads the cocotblib components, which captured the kernel triggers at their
+# import, so an other kernel (or the real cocotb) can be used afterward. installed() does both around a with block.
+#
+class TestFailure(Exception):
+    pass
+
+class TestError(Exception):
+    pass
+
+class TestSuccess(Exception):
+    pass
+
+class BinaryValue:
+    pass
+
+try:
+    from cocotb.result import ReturnValue
+except ImportError:
+    class ReturnValue(Exception):
+        def __init__(self, retval):
+            self.retval = retval
+
+class Waitable:
+    async def _wait(self):
+        raise NotImplementedError()
+
+    def __await__(self):
+        return self._wait().__await__()
+
+_components = ["Metrics", "misc", "Phase", "Scorboard", "Stream", "Flow", "Spi", "Apb3", "AhbLite3", "Axi4", "ClockDomain", "Watchdog", "RefModel", "Protocol"]
+
+_missing = object()
+_patched = []     # (object, attribute, previous value) set by install
+_stubModules = [] # Stand-in cocotb modules put in sys.modules by install
+
+def _patch(obj, attribute, value):
+    _patched.append((obj, attribute, getattr(obj, attribute, _missing)))
+    setattr(obj, attribute, value)
+
+def install(kernel=None):
+    global _kernel
+    loaded = [name for name in _components if "cocotblib." + name in sys.modules]
+    if len(loaded) != 0:
+        raise RuntimeError("SimKernel has to be installed before importing " + ", ".join(loaded))
+    if _kernel != None:
+        uninstall()
+    _kernel = kernel if kernel != None else SimKernel()
+
+    try:
+        import cocotb
+        import cocotb.triggers
+        import cocotb.utils
+        import cocotb.result
+        import cocotb.binary
+    except ImportError:
+        cocotb = types.ModuleType("cocotb")
+        cocotb.triggers = types.ModuleType("cocotb.triggers")
+        cocotb.utils = types.ModuleType("cocotb.utils")
+        cocotb.result = types.ModuleType("cocotb.result")
+        cocotb.binary = types.ModuleType("cocotb.binary")
+        cocotb.result.TestFailure = TestFailure
+        cocotb.result.TestError = TestError
+        cocotb.result.TestSuccess = TestSuccess
+        cocotb.result.ReturnValue = ReturnValue
+        cocotb.triggers.Waitable = Waitable
+        cocotb.binary.BinaryValue = BinaryValue
+        for module in [cocotb, cocotb.triggers, cocotb.utils, cocotb.result, cocotb.binary]:
+            sys.modules[module.__name__] = module
+            _stubModules.append(module.__name__)
+
+    _patch(cocotb, "fork", _kernel.fork)
+    _patch(cocotb, "start_soon", _kernel.fork)
+    if not isinstance(getattr(cocotb, "log", None), logging.Logger):
+        _patch(cocotb, "log", logging.getLogger("cocotb"))
+    for trigger in [Timer, ReadOnly, Edge, RisingEdge, FallingEdge, ClockCycles, First, Join, Event]:
+        _patch(cocotb.triggers, trigger.__name__, trigger)
+    _patch(cocotb.utils, "get_sim_time", _kernel.getSimTime)
+    return _kernel
+
+def uninstall():
+    global _kernel
+    for name in _components:
+        sys.modules.pop("cocotblib." + name, None)
+    for obj, attribute, value in reversed(_patched):
+        if value is _missing:
+            delattr(obj, attribute)
+        else:
+            setattr(obj, attribute, value)
+    _patched.clear()
+    for name in _stubModules:
+        sys.modules.pop(name, None)
+    _stubModules.clear()
+    _kernel = None
+
+@contextlib.contextmanager
+def installed(kernel=None):
+    kernel = install(kernel)
+    try:
+        yield kernel
+    finally:
+        uninstall()
+
+
+###############################################################################
+# Reference Python DUTs
+#
+def _addStream(dut, name, payloads):
+    dut.addSignal(name + "_valid")
+    dut.addSignal(name + "_ready")
+    for payloadName, width in payloads.items():
+        dut.addSignal(name + "_payload" + ("" if payloadName == None else "_" + payloadName), width)
+
+def _streamPayloads(dut, name):
+    prefix = name + "_payload"
+    return sorted([s for s in dut if s._name == prefix or s._name.startswith(prefix + "_")], key=lambda s: s._name)
+
+
+# Stream FIFO between io_push and io_pop, payloads is a {name : width} dict (None name => io_push_payload itself)
+class SimStreamFifo:
+    def __init__(self, dut, pushName, popName, depth, clk, reset=None):
+        self.push = (getattr(dut, pushName + "_valid"), getattr(dut, pushName + "_ready"), _streamPayloads(dut, pushName))
+        self.pop = (getattr(dut, popName + "_valid"), getattr(dut, popName + "_ready"), _streamPayloads(dut, popName))
+        self.depth = depth
+        self.clk = clk
+        self.reset = reset
+        self.queue = deque()
+        _kernel.fork(self.stim())
+
+    async def stim(self):
+        pushValid, pushReady, pushPayloads = self.push
+        popValid, popReady, popPayloads = self.pop
+        queue = self.queue
+        pushReady <= 0
+        popValid <= 0
+        while True:
+            await RisingEdge(self.clk)
+            if self.reset != None and int(self.reset) == 1:
+                queue.clear()
+                pushReady <= 0
+                popValid <= 0
+                continue
+            if int(popValid) and int(popReady):
+                queue.popleft()
+            if int(pushValid) and int(pushReady):
+                queue.append([int(s) for s in pushPayloads])
+            pushReady <= (len(queue) < self.depth)
+            popValid <= (len(queue) != 0)
+            if len(queue) != 0:
+                for signal, value in zip(popPayloads, queue[0]):
+                    signal <= value
+
+def streamFifoDut(payloads, depth, reset=True):
+    dut = SimDut()
+    dut.addSignal("clk")
+    if reset:
+        dut.addSignal("reset")
+    _addStream(dut, "io_push", payloads)
+    _addStream(dut, "io_pop", payloads)
+    dut.fifo = SimStreamFifo(dut, "io_push", "io_pop", depth, dut.clk, dut.reset if reset else None)
+    return dut
+
+
+# AHB-Lite memory slave without wait states, signals are <name>_HADDR, ...
+class SimAhbLite3Memory:
+    def __init__(self, dut, name, size, clk):
+        self.ahb = {n : getattr(dut, name + "_" + n) for n in ["HSEL", "HADDR", "HTRANS", "HWRITE", "HSIZE", "HWDATA", "HREADY", "HREADYOUT", "HRDATA", "HRESP"]}
+        self.ram = bytearray(size)
+        self.clk = clk
+        _kernel.fork(self.stim())
+
+    async def stim(self):
+        ahb = self.ahb
+        wordBytes = len(ahb["HWDATA"]) // 8
+        ahb["HREADYOUT"] <= 1
+        ahb["HRESP"] <= 0
+        pendingWrite = None
+        while True:
+            await RisingEdge(self.clk)
+            if int(ahb["HREADY"]) == 0:
+                continue
+            if pendingWrite != None:
+                address, size = pendingWrite
+                data = int(ahb["HWDATA"]) >> ((address % wordBytes) * 8)
+                self.ram[address:address + size] = (data & ((1 << size*8)-1)).to_bytes(size, "little")
+                pendingWrite = None
+            if int(ahb["HSEL"]) and int(ahb["HTRANS"]) >= 2:
+                address = int(ahb["HADDR"]) % len(self.ram)
+                size = 1 << int(ahb["HSIZE"])
+                if int(ahb["HWRITE"]):
+                    pendingWrite = (address, size)
+                else:
+                    ahb["HRDATA"] <= int.from_bytes(self.ram[address:address + size], "little") << ((address % wordBytes) * 8)
+
+def ahbLite3MemoryDut(addressWidth, dataWidth, size=None, name="ahb"):
+    dut = SimDut()
+    dut.addSignal("clk")
+    dut.addSignal("reset")
+    for signalName, width in [("HSEL", 1), ("HADDR", addressWidth), ("HWRITE", 1), ("HSIZE", 3), ("HBURST", 3), ("HPROT", 4),
+                              ("HTRANS", 2), ("HMASTLOCK", 1), ("HWDATA", dataWidth), ("HRDATA", dataWidth),
+                              ("HREADY", 1), ("HREADYOUT", 1), ("HRESP", 1)]:
+        dut.addSignal(name + "_" + signalName, width)
+    dut.memory = SimAhbLite3Memory(dut, name, size if size != None else 1 << addressWidth, dut.clk)
+    return dut
+
+
+# AXI4 memory slave, on the arw/w/b/r (shared) or aw/w/b/ar/r channels
+# The reads and the writes are executed in order on their own, up to one beat per cycle on each channel
+class SimAxi4Memory:
+    def __init__(self, dut, name, addressWidth, clk, reset=None, cmdDepth=4):
+        channelNames = ["arw", "w", "b", "r"] if hasattr(dut, name + "_arw_valid") else ["aw", "w", "b", "ar", "r"]
+        self.channels = {c : (getattr(dut, name + "_" + c + "_valid"), getattr(dut, name + "_" + c + "_ready"),
+                              {s._name[len(name + "_" + c + "_payload_"):] : s for s in _streamPayloads(dut, name + "_" + c)})
+                         for c in channelNames}
+        self.dataWidth = len(self.channels["w"][2]["data"])
+        self.ram = bytearray((1 << addressWidth) + self.dataWidth//8)
+        self.clk = clk
+        self.reset = reset
+        self.cmdDepth = cmdDepth
+        _kernel.fork(self.stim())
+
+    async def stim(self):
+        # (valid, ready, payload, write), write is None when given by the payload
+        cmdChannels = [self.channels[c] + ({"arw" : None, "aw" : True, "ar" : False}[c],) for c in ["arw", "aw", "ar"] if c in self.channels]
+        wValid, wReady, w = self.channels["w"]
+        bValid, bReady, b = self.channels["b"]
+        rValid, rReady, r = self.channels["r"]
+        wordBytes = self.dataWidth // 8
+        readCmds = deque()
+        writeCmds = deque()
+        wBeats = deque()
+        bRsps = deque()
+        rBeats = deque()
+        for valid, ready, payload, write in cmdChannels:
+            ready <= 0
+        wReady <= 0
+        bValid <= 0
+        rValid <= 0
+        while True:
+            await RisingEdge(self.clk)
+            if self.reset != None and int(self.reset) == 1:
+                for valid, ready, payload, write in cmdChannels:
+                    ready <= 0
+                wReady <= 0
+                continue
+            wReady <= 1
+            for valid, ready, payload, write in cmdChannels:
+                if int(valid) and int(ready):
+                    cmd = {n : int(s) for n, s in payload.items()}
+                    (writeCmds if (cmd["write"] if write == None else write) else readCmds).append(cmd)
+            if int(wValid) and int(wReady):
+                wBeats.append((int(w["data"]), int(w["strb"])))
+            if int(bValid) and int(bReady):
+                bRsps.popleft()
+            if int(rValid) and int(rReady):
+                rBeats.popleft()
+
+            if len(writeCmds) != 0 and len(wBeats) > writeCmds[0]["len"]:
+                cmd = writeCmds.popleft()
+                addresses, lanes = burstSequence(cmd["addr"], cmd["len"], cmd["size"], cmd["burst"], self.dataWidth)
+                for address in addresses:
+                    data, strb = wBeats.popleft()
+                    base = address & ~(wordBytes-1)
+                    for i in range(wordBytes):
+                        if (strb >> i) & 1:
+                            self.ram[base + i] = (data >> (i*8)) & 0xFF
+                bRsps.append(cmd.get("id", 0))
+            if len(readCmds) != 0 and len(rBeats) < 2:
+                cmd = readCmds.popleft()
+                addresses, lanes = burstSequence(cmd["addr"], cmd["len"], cmd["size"], cmd["burst"], self.dataWidth)
+                for beat, address in enumerate(addresses):
+                    base = address & ~(wordBytes-1)
+                    rBeats.append((int.from_bytes(self.ram[base:base + wordBytes], "little"), cmd.get("id", 0), beat == cmd["len"]))
+
+            for valid, ready, payload, write in cmdChannels:
+                ready <= (len(readCmds) + len(writeCmds) < self.cmdDepth)
+            bValid <= (len(bRsps) != 0)
+            if len(bRsps) != 0:
+                if "id" in b:
+                    b["id"] <= bRsps[0]
+                b["resp"] <= 0
+            rValid <= (len(rBeats) != 0)
+            if len(rBeats) != 0:
+                data, rid, last = rBeats[0]
+                r["data"] <= data
+                if "id" in r:
+                    r["id"] <= rid
+                r["resp"] <= 0
+                r["last"] <= last
+
+def _axi4Cmd(addressWidth, idWidth):
+    return {"addr" : addressWidth, "id" : idWidth, "region" : 4, "len" : 8, "size" : 3, "burst" : 2,
+            "lock" : 1, "cache" : 4, "qos" : 4, "prot" : 3}
+
+def _addAxi4Data(dut, name, dataWidth, idWidth):
+    _addStream(dut, name + "_w", {"data" : dataWidth, "strb" : dataWidth//8, "last" : 1})
+    _addStream(dut, name + "_b", {"id" : idWidth, "resp" : 2})
+    _addStream(dut, name + "_r", {"data" : dataWidth, "id" : idWidth, "resp" : 2, "last" : 1})
+
+def axi4SharedMemoryDut(addressWidth, dataWidth, idWidth, name="axi"):
+    dut = SimDut()
+    dut.addSignal("clk")
+    dut.addSignal("reset")
+    _addStream(dut, name + "_arw", dict(_axi4Cmd(addressWidth, idWidth), write=1))
+    _addAxi4Data(dut, name, dataWidth, idWidth)
+    dut.memory = SimAxi4Memory(dut, name, addressWidth, dut.clk, dut.reset)
+    return dut
+
+def axi4MemoryDut(addressWidth, dataWidth, idWidth, name="axi"):
+    dut = SimDut()
+    dut.addSignal("clk")
+    dut.addSignal("reset")
+    _addStream(dut, name + "_aw", _axi4Cmd(addressWidth, idWidth))
+    _addStream(dut, name + "_ar", _axi4Cmd(addressWidth, idWidth))
+    _addAxi4Data(dut, name, dataWidth, idWidth)
+    dut.memory = SimAxi4Memory(dut, name, addressWidth, dut.clk, dut.reset)
+    return dut
@@ -1,12 +1,12 @@
 import random
 
 import cocotb
-from cocotb.decorators import coroutine
-from cocotb.result import TestFailure, ReturnValue
-from cocotb.triggers import RisingEdge, Edge, Timer
+from cocotb.result import TestFailure
+from cocotb.triggers import RisingEdge, Edge, Timer, First
 
+from cocotblib.Phase import forkIn
 from cocotblib.TriState import TriStateOutput
-from cocotblib.misc import log2Up, BoolRandomizer, assertEquals, testBit
+from cocotblib.misc import log2Up, BoolRandomizer, assertEquals, testBit, rawSignal, retvalCoroutine
 
 
 class SpiMaster:
@@ -47,41 +47,170 @@ class SpiSlaveMaster:
         self.dataWidth = dataWidth
         self.spi.sclk <= cpol
 
-    @coroutine
-    def enable(self):
+    async def enable(self):
         self.spi.ss <= False
-        yield Timer(self.baudPeriode)
+        await Timer(self.baudPeriode)
 
-    @coroutine
-    def disable(self):
-        yield Timer(self.baudPeriode)
+    async def disable(self):
+        await Timer(self.baudPeriode)
         self.spi.ss <= True
-        yield Timer(self.baudPeriode)
+        await Timer(self.baudPeriode)
 
-    @coroutine
-    def exchange(self, masterData):
+    @retvalCoroutine
+    async def exchange(self, masterData):
         buffer = ""
         if not self.cpha:
             for i in range(self.dataWidth):
                 self.spi.mosi <= testBit(masterData, self.dataWidth - 1 - i)
-                yield Timer(self.baudPeriode >> 1)
+                await Timer(self.baudPeriode >> 1)
                 buffer = buffer + str(self.spi.miso.write) if bool(self.spi.miso.writeEnable) else "x"
                 self.spi.sclk <= (not self.cpol)
-                yield Timer(self.baudPeriode >> 1)
+                await Timer(self.baudPeriode >> 1)
                 self.spi.sclk <= (self.cpol)
         else:
             for i in range(self.dataWidth):
                 self.spi.mosi <= testBit(masterData, self.dataWidth -1  - i)
                 self.spi.sclk <= (not self.cpol)
-                yield Timer(self.baudPeriode >> 1)
+                await Timer(self.baudPeriode >> 1)
                 buffer = buffer + str(self.spi.miso.write) if bool(self.spi.miso.writeEnable) else "x"
                 self.spi.sclk <= (self.cpol)
-                yield Timer(self.baudPeriode >> 1)
-
-        raise ReturnValue(buffer)
-
-    @coroutine
-    def exchangeCheck(self, masterData, slaveData):
-        c = self.exchange(masterData)
-        yield c
-        assert slaveData == int(c.retval,2)
\ No newline at end of file
+                await Timer(self.baudPeriode >> 1)
+
+        return buffer
+
+    async def exchangeCheck(self, masterData, slaveData):
+        buffer = await self.exchange(masterData)
+        assert slaveData == int(buffer,2)
+
+
+
+###############################################################################
+# SPI slave model answering a DUT SPI master, driven by the sclk / ss edges
+#
+# Usage :
+#
+#    flash = SpiFlashModel(bytearray(open("firmware.bin", "rb").read()))
+#    responder = SpiSlaveResponder(SpiMaster(dut, "io_spi"), cpol=False, cpha=False, source=flash)
+#
+# source can be :
+# - A bytes/bytearray/list of words, served in order across the transactions (all ones once exhausted)
+# - A callable(received) returning the next word, received being the words already gotten from mosi
+#   in the current transaction
+#
+# miso is driven directly, or through its write/writeEnable if it is a TriStateOutput.
+# Between the transactions the model only wait on ss, there is no per cycle cost.
+#
+class SpiSlaveResponder:
+    def __init__(self, spi, cpol, cpha, source, dataWidth=8, ssIndex=0, onTransaction=None, parent=None):
+        self.spi = spi
+        self.cpol = int(cpol)
+        self.cpha = int(cpha)
+        self.source = source
+        self.sourceIndex = 0
+        self.dataWidth = dataWidth
+        self.ssIndex = ssIndex
+        self.onTransaction = onTransaction
+        self.transactionCounter = 0
+        self.wordCounter = 0
+        forkIn(parent, self.stim)
+
+    def nextWord(self, received):
+        if callable(self.source):
+            return self.source(received)
+        if self.sourceIndex < len(self.source):
+            word = self.source[self.sourceIndex]
+            self.sourceIndex += 1
+            return word
+        return (1 << self.dataWidth)-1
+
+    def driveMiso(self, value):
+        miso = self.spi.miso
+        if hasattr(miso, "writeEnable"):
+            miso.write <= value
+            miso.writeEnable <= 1
+        else:
+            miso <= value
+
+    def releaseMiso(self):
+        if hasattr(self.spi.miso, "writeEnable"):
+            self.spi.miso.writeEnable <= 0
+
+    async def stim(self):
+        spi = self.spi
+        sclk = rawSignal(spi.sclk)
+        mosi = rawSignal(spi.mosi)
+        ss   = rawSignal(spi.ss)
+        msb = self.dataWidth - 1
+        self.releaseMiso()
+        while True:
+            while (ss.read() >> self.ssIndex) & 1 != 0:
+                await Edge(spi.ss)
+
+            received = []
+            bitId = 0
+            mosiWord = 0
+            misoWord = self.nextWord(received)
+            lastSclk = sclk.read()
+            if self.cpha == 0:
+                self.driveMiso((misoWord >> msb) & 1)
+
+            while True:
+                await First(Edge(spi.sclk), Edge(spi.ss))
+                if (ss.read() >> self.ssIndex) & 1 != 0:
+                    break
+                value = sclk.read()
+                if value == lastSclk:
+                    continue
+                lastSclk = value
+                leading = value != self.cpol
+                if leading != bool(self.cpha):
+                    # Sample edge
+                    mosiWord = (mosiWord << 1) | mosi.read()
+                    bitId += 1
+                    if bitId == self.dataWidth:
+                        received.append(mosiWord)
+                        self.wordCounter += 1
+                        mosiWord = 0
+                        bitId = 0
+                        misoWord = self.nextWord(received)
+                else:
+                    # Shift edge
+                    self.driveMiso((misoWord >> (msb - bitId)) & 1)
+
+            self.releaseMiso()
+            self.transactionCounter += 1
+            if self.onTransaction != None:
+                self.onTransaction(received)
+
+
+###############################################################################
+# Serial flash read commands emulation, to be used as a SpiSlaveResponder source
+#
+# Supported : READ (0x03), FAST_READ (0x0B, one dummy byte), READ_ID (0x9F)
+#
+class SpiFlashModel:
+    READ = 0x03
+    FAST_READ = 0x0B
+    READ_ID = 0x9F
+
+    def __init__(self, memory, addressBytes=3, jedecId=(0xEF, 0x40, 0x18)):
+        self.memory = memory
+        self.addressBytes = addressBytes
+        self.jedecId = jedecId
+
+    def __call__(self, received):
+        if len(received) == 0:
+            return 0xFF
+        cmd = received[0]
+        if cmd == self.READ_ID:
+            index = len(received) - 1
+            return self.jedecId[index] if index < len(self.jedecId) else 0xFF
+        if cmd == self.READ or cmd == self.FAST_READ:
+            dataStart = 1 + self.addressBytes + (1 if cmd == self.FAST_READ else 0)
+            if len(received) < dataStart:
+                return 0xFF
+            address = 0
+            for byte in received[1:1 + self.addressBytes]:
+                address = (address << 8) | byte
+            return self.memory[(address + len(received) - dataStart) % len(self.memory)]
+        return 0xFF
@@ -1,12 +1,13 @@
 
 import cocotb
 import types
+from collections import deque
 from cocotb.result import TestFailure
 from cocotb.triggers import RisingEdge, Timer, Event
-from cocotblib.Phase import Infrastructure, PHASE_WAIT_TASKS_END
+from cocotblib.Phase import Infrastructure, PHASE_WAIT_TASKS_END, forkIn
 from cocotblib.Scorboard import ScorboardInOrder
 
-from cocotblib.misc import Bundle, BoolRandomizer
+from cocotblib.misc import Bundle, BundleCapture, BoolRandomizer, rawSignal
 
 
 class Stream:
@@ -14,35 +15,53 @@ class Stream:
         self.valid   = dut.__getattr__(name + "_valid")
         self.ready   = dut.__getattr__(name + "_ready")
         self.payload = Bundle(dut,name + "_payload")
+        self.rawValid = rawSignal(self.valid)
+        self.rawReady = rawSignal(self.ready)
         # Event
         self.event_ready = Event()
         self.event_valid = Event()
+        self.captureReady = None
+        self.captureValid = None
 
-    def startMonitoringReady(self, clk):
+    # With a capacity, the payloads are copied into captureReady/captureValid (BundleCapture)
+    # and the events are set with it instead of the live payload
+    def startMonitoringReady(self, clk, capacity=None):
         self.clk  = clk
+        if capacity != None:
+            self.captureReady = BundleCapture(self.payload, capacity)
         self.fork_ready = cocotb.fork(self.monitor_ready())
 
-    def startMonitoringValid(self, clk):
+    def startMonitoringValid(self, clk, capacity=None):
         self.clk  = clk
+        if capacity != None:
+            self.captureValid = BundleCapture(self.payload, capacity)
         self.fork_valid = cocotb.fork(self.monitor_valid())
 
     def stopMonitoring(self):
         self.fork_ready.kill()
         self.fork_valid.kill()
 
-    @cocotb.coroutine
-    def monitor_ready(self):
+    async def monitor_ready(self):
+        capture = self.captureReady
         while True:
-            yield RisingEdge(self.clk)
-            if int(self.ready) == 1:
-                self.event_ready.set( self.payload )
+            await RisingEdge(self.clk)
+            if self.rawReady.read() == 1:
+                if capture != None:
+                    capture.sample()
+                    self.event_ready.set( capture )
+                else:
+                    self.event_ready.set( self.payload )
 
-    @cocotb.coroutine
-    def monitor_valid(self):
+    async def monitor_valid(self):
+        capture = self.captureValid
         while True:
-            yield RisingEdge(self.clk)
-            if int(self.valid) == 1:
-                self.event_valid.set( self.payload )
+            await RisingEdge(self.clk)
+            if self.rawValid.read() == 1:
+                if capture != None:
+                    capture.sample()
+                    self.event_valid.set( capture )
+                else:
+                    self.event_valid.set( self.payload )
 
 
 class Transaction(object):
@@ -82,87 +101,225 @@ class Transaction(object):
 
 # Transaction = type('Transaction', (object,), {})
 
+# Transactor return value meaning that there is nothing to send until notify() is called on the driver
+WAIT_WORK = object()
+
+###############################################################################
+# Drive a stream from a transactor (function or generator returning Transactions, or None for an idle cycle)
+#
+# Packets can also be queued with sendPacket, they are split into beats of the data element width,
+# last and keep being driven when the stream has them. Packets have the priority over the transactor.
+#
+# When the transactor returns WAIT_WORK (or without transactor nor packet), the driver sleeps on its work event
+# instead of polling each cycle, notify() and sendPacket wake it up.
+#
+# Usage :
+#
+#    driver = StreamDriverMaster(dut_io_push, None, dut.clk, dut.reset)
+#    await driver.sendPacket(frame).wait()                 # bytes, bytearray, memoryview ...
+#    driver.sendPacket(memoryview(buffer)[0:1500], user=3) # Other payload elements are constant over the packet
+#
 class StreamDriverMaster:
-    def __init__(self,stream,transactor,clk,reset):
+    def __init__(self,stream,transactor,clk,reset,parent=None):
         self.stream = stream
         self.clk = clk
         self.reset = reset
         self.transactor = transactor
-
-        cocotb.fork(self.stim())
-
-    @cocotb.coroutine
-    def stim(self):
+        self.packets = deque()
+        self.packet = None
+        self.workEvent = Event()
+
+        forkIn(parent, self.stim)
+
+    def notify(self):
+        self.workEvent.set()
+
+    # Return an Event set when the last beat of the packet is transferred
+    def sendPacket(self, data, dataName="data", lastName="last", keepName="keep", **elements):
+        view = memoryview(data).cast("B")
+        if len(view) == 0:
+            raise Exception("Empty packet")
+        payload = self.stream.payload.nameToElement
+        dataElement = payload[dataName]
+        bytesPerBeat = len(dataElement) // 8
+        keep = payload.get(keepName)
+        if keep == None and len(view) % bytesPerBeat != 0:
+            raise Exception("Packet of %d bytes on a %d bytes stream without %s" % (len(view), bytesPerBeat, keepName))
+        for name in payload:
+            if name not in (dataName, lastName, keepName) and name not in elements:
+                raise Exception("Missing element in bundle :" + name)
+        done = Event()
+        self.packets.append((view, dataElement, bytesPerBeat, payload.get(lastName), keep, elements, done))
+        self.notify()
+        return done
+
+    def _drivePacketBeat(self):
+        if self.packet == None:
+            self.packet = self.packets.popleft()
+            self.packetOffset = 0
+            for name, value in self.packet[5].items():
+                self.stream.payload.nameToElement[name] <= value
+        view, data, bytesPerBeat, last, keep, elements, done = self.packet
+        offset = self.packetOffset
+        end = min(offset + bytesPerBeat, len(view))
+        data <= int.from_bytes(view[offset:end], "little")
+        if keep != None:
+            keep <= (1 << (end - offset)) - 1
+        isLast = end == len(view)
+        if last != None:
+            last <= isLast
+        self.packetOffset = end
+        if isLast:
+            self.packet = None
+            return done
+        return None
+
+    async def stim(self):
         stream = self.stream
+        valid = stream.rawValid
+        ready = stream.rawReady
         stream.valid <= 0
+        packetDone = None
         while True:
-            yield RisingEdge(self.clk)
-            if int(stream.valid) == 1 and int(stream.ready) == 1:
+            await RisingEdge(self.clk)
+            if valid.read() == 1 and ready.read() == 1:
                 stream.valid <= 0
+                if packetDone != None:
+                    packetDone.set()
+                    packetDone = None
                 for i in range(nextDelay):
-                    yield RisingEdge(self.clk)
+                    await RisingEdge(self.clk)
 
-            if self.transactor != None and (int(stream.valid) == 0 or int(stream.ready) == 1):
-                if isinstance(self.transactor,types.GeneratorType):
-                    trans = next(self.transactor)
+            if valid.read() == 0 or ready.read() == 1:
+                if self.packet != None or len(self.packets) != 0:
+                    nextDelay = 0
+                    stream.valid <= 1
+                    packetDone = self._drivePacketBeat()
                 else:
-                    trans = self.transactor()
-                if trans != None:
-                    if hasattr(trans,"nextDelay"):
-                        nextDelay = trans.nextDelay
+                    if self.transactor == None:
+                        trans = WAIT_WORK
+                    elif isinstance(self.transactor,types.GeneratorType):
+                        trans = next(self.transactor)
                     else:
-                        nextDelay = 0
-                    stream.valid <= 1
-
-                    for name in stream.payload.nameToElement:
-                        if hasattr(trans,name) == False:
-                            raise Exception("Missing element in bundle :" + name)
-                        e = stream.payload.nameToElement[name] <= getattr(trans,name)
+                        trans = self.transactor()
+                    if trans is WAIT_WORK:
+                        # A notify since the last sleep may have been missed, only wait when there was none
+                        if not self.workEvent.is_set():
+                            await self.workEvent.wait()
+                        self.workEvent.clear()
+                    elif trans != None:
+                        if hasattr(trans,"nextDelay"):
+                            nextDelay = trans.nextDelay
+                        else:
+                            nextDelay = 0
+                        stream.valid <= 1
+
+                        for name in stream.payload.nameToElement:
+                            if hasattr(trans,name) == False:
+                                raise Exception("Missing element in bundle :" + name)
+                            e = stream.payload.nameToElement[name] <= getattr(trans,name)
 
 
 
 class StreamDriverSlave:
-    def __init__(self,stream,clk,reset):
+    def __init__(self,stream,clk,reset,parent=None):
         self.stream = stream
         self.clk = clk
         self.reset = reset
         self.randomizer = BoolRandomizer()
-        cocotb.fork(self.stim())
+        forkIn(parent, self.stim)
 
-    @cocotb.coroutine
-    def stim(self):
+    async def stim(self):
         stream = self.stream
         stream.ready <= 1
         while True:
-            yield RisingEdge(self.clk)
+            await RisingEdge(self.clk)
             stream.ready <= self.randomizer.get()
 
 
 def TransactionFromBundle(bundle):
     trans = Transaction()
-    for name in bundle.nameToElement:
-        setattr(trans,name, int(bundle.nameToElement[name]))
+    for name, raw in bundle.nameToRaw.items():
+        setattr(trans,name, raw.read())
     return trans
 
 
+###############################################################################
+# Call callback(Transaction) on each stream transfer
+#
+# With maxPacketSize, the monitor is in packet mode instead : the data of the beats is reassembled into a
+# preallocated buffer (keep being honored when the stream has it) and callback(packet) is called on each last beat,
+# packet being a memoryview of the buffer only valid during the callback (use bytes(packet) to keep it).
+# Without last element, a packet is delimited every maxPacketSize bytes.
+#
+# Usage :
+#
+#    StreamMonitor(dut_io_pop, lambda packet: scoreboard.uutPush(bytes(packet)), dut.clk, dut.reset, maxPacketSize=9000)
+#
 class StreamMonitor:
-    def __init__(self,stream,callback,clk,reset):
+    def __init__(self,stream,callback,clk,reset,maxPacketSize=None,dataName="data",lastName="last",keepName="keep",parent=None):
         self.stream = stream
         self.callback = callback
         self.clk = clk
         self.reset = reset
-        cocotb.fork(self.stim())
-
-    @cocotb.coroutine
-    def stim(self):
+        self.transferCounter = 0
+        self.packetCounter = 0
+        if maxPacketSize != None:
+            forkIn(parent, lambda: self.stimPacket(maxPacketSize, dataName, lastName, keepName))
+        else:
+            forkIn(parent, self.stim)
+
+    async def stim(self):
         stream = self.stream
+        valid = stream.rawValid
+        ready = stream.rawReady
         while True:
-            yield RisingEdge(self.clk)
-            if int(stream.valid) == 1 and int(stream.ready) == 1:
+            await RisingEdge(self.clk)
+            if valid.read() == 1 and ready.read() == 1:
+                self.transferCounter += 1
                 trans = TransactionFromBundle(stream.payload)
-                yield Timer(1)
+                await Timer(1)
                 self.callback(trans)
 
+    async def stimPacket(self, maxPacketSize, dataName, lastName, keepName):
+        stream = self.stream
+        valid = stream.rawValid
+        ready = stream.rawReady
+        data = stream.payload.nameToRaw[dataName]
+        last = stream.payload.nameToRaw.get(lastName)
+        keep = stream.payload.nameToRaw.get(keepName)
+        bytesPerBeat = len(data) // 8
+        fullKeep = (1 << bytesPerBeat) - 1
+        # One spare beat, the data is always copied as a whole beat before being trimmed by keep
+        buffer = bytearray((maxPacketSize + bytesPerBeat - 1) // bytesPerBeat * bytesPerBeat + bytesPerBeat)
+        view = memoryview(buffer)
+        offset = 0
+        while True:
+            await RisingEdge(self.clk)
+            if valid.read() == 1 and ready.read() == 1:
+                self.transferCounter += 1
+                view[offset:offset + bytesPerBeat] = data.read().to_bytes(bytesPerBeat, "little")
+                if keep == None:
+                    offset += bytesPerBeat
+                else:
+                    keepValue = keep.read()
+                    if keepValue == fullKeep:
+                        offset += bytesPerBeat
+                    else:
+                        # Sparse keep, compact the kept bytes
+                        beat = bytes(view[offset:offset + bytesPerBeat])
+                        for i in range(bytesPerBeat):
+                            if (keepValue >> i) & 1:
+                                buffer[offset] = beat[i]
+                                offset += 1
+                if offset > maxPacketSize:
+                    raise TestFailure("Packet bigger than %d bytes on %s" % (maxPacketSize, stream.valid._name))
+                if (last.read() == 1) if last != None else (offset == maxPacketSize):
+                    self.packetCounter += 1
+                    await Timer(1)
+                    self.callback(view[0:offset])
+                    offset = 0
+
 
 
 
@@ -181,10 +338,10 @@ class StreamFifoTester(Infrastructure):
         self.scoreboard = ScorboardInOrder("scoreboard", self)
 
     def createInfrastructure(self):
-        StreamDriverMaster(self.pushStream, self.genPush, self.clk, self.reset)
-        StreamDriverSlave(self.popStream, self.clk, self.reset)
-        StreamMonitor(self.popStream, self.onUut, self.clk, self.reset)
-        StreamMonitor(self.pushStream, self.onRef, self.clk, self.reset)
+        StreamDriverMaster(self.pushStream, self.genPush, self.clk, self.reset, parent=self)
+        StreamDriverSlave(self.popStream, self.clk, self.reset, parent=self)
+        StreamMonitor(self.popStream, self.onUut, self.clk, self.reset, parent=self)
+        StreamMonitor(self.pushStream, self.onRef, self.clk, self.reset, parent=self)
 
     def startPhase(self, phase):
         Infrastructure.startPhase(self, phase)
@@ -192,7 +349,9 @@ class StreamFifoTester(Infrastructure):
             self.closeIt = True
 
     def genPush(self):
-        if not self.closeIt and self.pushRandomizer.get():
+        if self.closeIt:
+            return WAIT_WORK
+        if self.pushRandomizer.get():
             return self.transactionGenerator()
 
     def onUut(self, uut):
@@ -202,7 +361,10 @@ class StreamFifoTester(Infrastructure):
     def onRef(self, uut):
         self.scoreboard.refPush(uut)
 
+    # dutCounterTarget can be None to only rely on the children (coverage goals)
     def canPhaseProgress(self, phase):
-        return self.dutCounter > self.dutCounterTarget
+        if not Infrastructure.canPhaseProgress(self, phase):
+            return False
+        return self.dutCounterTarget == None or self.dutCounter > self.dutCounterTarget
 
 
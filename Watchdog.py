@@ -0,0 +1,89 @@
+from cocotb.result import TestFailure
+from cocotb.triggers import ClockCycles
+
+from cocotblib.Phase import Infrastructure, PHASE_SIM, PHASE_WAIT_TASKS_END, PHASE_CHECK_SCORBOARDS
+
+
+###############################################################################
+# Fail the test when none of the watched progress counters moved for timeoutCycles
+#
+# Usage :
+#
+#    watchdog = Watchdog("watchdog", phaseManager, dut.clk, 10000)
+#    watchdog.watchStreamMonitor("pop", popMonitor)
+#    watchdog.watchScoreboard(tester.scoreboard)
+#    watchdog.watchCounter("ahbReads", ahbReadChecker, "counter")
+#    watchdog.watchScoreboard(axiChecker.writeRspScoreboard)
+#
+# The counters are only polled every checkPeriod cycles, which is the resolution of the timeout.
+# In PHASE_WAIT_TASKS_END, the watch stops once the whole tree can progress : only the fixed waitTasksEndTime
+# of the PhaseManager is left, where nothing has to move anymore.
+#
+class Watchdog(Infrastructure):
+    def __init__(self, name, parent, clk, timeoutCycles, checkPeriod=None):
+        Infrastructure.__init__(self, name, parent)
+        self.clk = clk
+        self.timeoutCycles = timeoutCycles
+        self.checkPeriod = checkPeriod if checkPeriod != None else max(1, timeoutCycles // 8)
+        self.probeNames = []
+        self.probes = []
+        self.scoreboards = []
+        self.fork(self.stim)
+
+    # getter return a counter which change when there is some progress
+    def addProbe(self, name, getter):
+        self.probeNames.append(name)
+        self.probes.append(getter)
+
+    def watchCounter(self, name, obj, attribute):
+        self.addProbe(name, lambda: getattr(obj, attribute))
+
+    def watchStreamMonitor(self, name, monitor):
+        self.watchCounter(name, monitor, "transferCounter")
+
+    def watchScoreboard(self, scoreboard):
+        self.scoreboards.append(scoreboard)
+        self.watchCounter(scoreboard.getPath(), scoreboard, "matchCounter")
+
+    def tasksEnded(self):
+        root = self
+        while root.parent != None:
+            root = root.parent
+        return root.canPhaseProgress(PHASE_WAIT_TASKS_END)
+
+    async def stim(self):
+        values = None
+        lastChange = []
+        cycle = 0
+        while True:
+            await ClockCycles(self.clk, self.checkPeriod)
+            cycle += self.checkPeriod
+            phase = self.getPhase()
+            if phase >= PHASE_CHECK_SCORBOARDS:
+                break
+            if phase != PHASE_SIM and phase != PHASE_WAIT_TASKS_END:
+                continue
+            if phase == PHASE_WAIT_TASKS_END and self.tasksEnded():
+                values = None # Restart the timeout window if some task get pending again
+                continue
+
+            newValues = [probe() for probe in self.probes]
+            if values == None or len(values) != len(newValues):
+                values = newValues
+                lastChange = [cycle] * len(newValues)
+                continue
+            for i in range(len(values)):
+                if values[i] != newValues[i]:
+                    lastChange[i] = cycle
+            values = newValues
+            if cycle - max(lastChange, default=cycle) >= self.timeoutCycles:
+                raise TestFailure(self.getDiagnostic(values, lastChange, cycle))
+
+    def getDiagnostic(self, values, lastChange, cycle):
+        buffer = "%s : no progress since %d cycles\n" % (self.getPath(), cycle - max(lastChange))
+        for name, value, change in zip(self.probeNames, values, lastChange):
+            buffer += "    %s stuck at %s since %d cycles\n" % (name, value, cycle - change)
+        for scoreboard in self.scoreboards:
+            refs, uuts = scoreboard.getPendingCount()
+            buffer += "    %s pending : %d REF, %d UUT\n" % (scoreboard.getPath(), refs, uuts)
+        return buffer
@@ -1,13 +1,20 @@
+import functools
 import random
+from array import array
+from collections.abc import Coroutine
 
 import cocotb
 from cocotb.binary import BinaryValue
-from cocotb.decorators import coroutine
 from cocotb.result import TestFailure
-from cocotb.triggers import Timer, RisingEdge
+from cocotb.triggers import Timer, RisingEdge, Edge, First, ClockCycles, Waitable
+from cocotb.utils import get_sim_time
 
+from cocotblib.Metrics import getMetrics
 
+
+# Process wide X/Z => 0 resolution for int(handle), and for the library RawSignal reads (default X_POLICY.ZERO)
 def cocotbXHack():
+    setDefaultXPolicy(X_POLICY.ZERO)
     if hasattr(BinaryValue,"_resolve_to_0"):
         # cocotb <= 1.4.0
         BinaryValue._resolve_to_0     = BinaryValue._resolve_to_0  + BinaryValue._resolve_to_error
@@ -17,6 +24,199 @@ def cocotbXHack():
         cocotb.binary.resolve_x_to = "ZEROS"
         cocotb.binary._resolve_table = cocotb.binary._ResolveTable()
 
+###############################################################################
+# Raw integer sampling of signals
+#
+# Usage :
+#
+#    valid = rawSignal(dut.io_push_valid)
+#    setXPolicy(dut.io_push_payload, X_POLICY.RANDOM)
+#    setDefaultXPolicy(X_POLICY.ZERO)  # For all the signals without their own policy
+#    if valid.read() == 1:
+#        ...
+#
+# The default is X_POLICY.ERROR, as int(handle) do, cocotbXHack() switch it to X_POLICY.ZERO.
+#
+class X_POLICY:
+    ZERO   = 0  # X/Z bits are read as 0
+    ERROR  = 1  # X/Z bits fail the test
+    RANDOM = 2  # X/Z bits are read as random values
+
+_defaultXPolicy = X_POLICY.ERROR
+
+def setDefaultXPolicy(xPolicy):
+    global _defaultXPolicy
+    _defaultXPolicy = xPolicy
+
+_resolveToZero  = str.maketrans("UXZWLH-uxzwlh", "0000010000001")
+_unresolvedMask = str.maketrans("01LHlhUXZW-uxzw", "000000111111111")
+
+def _binstrReader(handle):
+    gpiHandle = getattr(handle, "_handle", None)
+    if gpiHandle == None:
+        return None
+    if hasattr(gpiHandle, "get_signal_val_binstr"):
+        # cocotb >= 1.4
+        return gpiHandle.get_signal_val_binstr
+    from cocotb import simulator
+    return lambda: simulator.get_signal_val_binstr(gpiHandle)
+
+class RawSignal:
+    def __init__(self, handle, xPolicy=None):
+        self.handle = handle
+        self.xPolicy = xPolicy # None => the default one
+        self._binstr = _binstrReader(handle)
+        if self._binstr == None:
+            # Not a simulator handle, let it convert itself
+            self.read = self._readInt
+
+    def read(self):
+        value = self._binstr()
+        try:
+            return int(value, 2)
+        except ValueError:
+            return self._resolve(value)
+
+    def _readInt(self):
+        return int(self.handle)
+
+    def _resolve(self, value):
+        xPolicy = self.xPolicy if self.xPolicy != None else _defaultXPolicy
+        if xPolicy == X_POLICY.ERROR:
+            raise TestFailure("%s has unresolved bits : %s" % (self.handle._name, value))
+        resolved = int(value.translate(_resolveToZero), 2)
+        if xPolicy == X_POLICY.RANDOM:
+            resolved |= random.getrandbits(len(value)) & int(value.translate(_unresolvedMask), 2)
+        return resolved
+
+    def __int__(self):
+        return self.read()
+
+    def __len__(self):
+        return len(self.handle)
+
+
+_rawSignals = {}
+
+# Cached RawSignal of a handle
+def rawSignal(handle):
+    raw = _rawSignals.get(handle)
+    if raw == None:
+        raw = RawSignal(handle)
+        _rawSignals[handle] = raw
+    return raw
+
+def setXPolicy(handle, xPolicy):
+    rawSignal(handle).xPolicy = xPolicy
+
+
+###############################################################################
+# Signal writes only issued when the driven value change
+#
+# Usage :
+#
+#    cache = WriteCache()
+#    cache.write(dut.io_valid, 1)
+#    cache.write(dut.io_payload, 42)
+#    cache.flush() # Issue the writes of the cycle
+#
+# The cache assume it is the only one driving its signals, use invalidate if something else drive one of them.
+#
+class WriteCache:
+    def __init__(self):
+        self.values = {}
+        self.pending = {}
+        self.writeCounter = 0
+        self.suppressedCounter = 0
+
+    def write(self, handle, value):
+        self.pending[handle] = value
+
+    def flush(self):
+        values = self.values
+        for handle, value in self.pending.items():
+            if values.get(handle) != value:
+                handle <= value
+                values[handle] = value
+                self.writeCounter += 1
+            else:
+                self.suppressedCounter += 1
+        self.pending.clear()
+
+    def invalidate(self, handle=None):
+        if handle == None:
+            self.values.clear()
+        else:
+            self.values.pop(handle, None)
+
+
+###############################################################################
+# Native coroutine which keep the .retval of the legacy @cocotb.coroutine ones, for the callers written before
+# the library moved to async def
+#
+# Usage :
+#
+#    @retvalCoroutine
+#    async def read(self, address):
+#        ...
+#        return value
+#
+#    value = await apb.read(0x10)                                   # Native await, no scheduler round trip
+#    thread = apb.read(0x10); yield thread; value = thread.retval   # Legacy @cocotb.coroutine callers
+#    task = cocotb.fork(apb.read(0x10))                             # Still a coroutine for the scheduler
+#
+class RetvalCoroutine(Waitable, Coroutine):
+    def __init__(self, coroutine):
+        self.coroutine = coroutine
+        self.__name__ = coroutine.__name__
+        self.__qualname__ = coroutine.__qualname__
+        self.finished = False
+        self.value = None
+
+    @property
+    def retval(self):
+        if not self.finished:
+            raise RuntimeError("%s is not complete" % self.__qualname__)
+        return self.value
+
+    def _complete(self, value):
+        self.finished = True
+        self.value = value
+
+    def __await__(self):
+        value = yield from self.coroutine.__await__()
+        self._complete(value)
+        return value
+
+    # Yielded by a legacy coroutine, the scheduler run it as a task
+    async def _wait(self):
+        return await self
+
+    # Forked, the scheduler drive it as a coroutine
+    def send(self, value):
+        try:
+            return self.coroutine.send(value)
+        except StopIteration as e:
+            self._complete(e.value)
+            raise
+
+    def throw(self, *args):
+        try:
+            return self.coroutine.throw(*args)
+        except StopIteration as e:
+            self._complete(e.value)
+            raise
+
+    def close(self):
+        self.coroutine.close()
+
+def retvalCoroutine(function):
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        return RetvalCoroutine(function(*args, **kwargs))
+    return wrapper
+
+
 def log2Up(value):
     return value.bit_length()-1
 
@@ -36,12 +236,8 @@ def randBoolSignal(that,prob):
     that <= (random.random() < prob)
 
 
-@coroutine
-def clockedWaitTrue(clk,that):
-    while True:
-        yield RisingEdge(clk)
-        if that == True:
-            break
+async def clockedWaitTrue(clk,that):
+    await waitClockedValue(clk, that, 1)
 
 def assertEquals(a, b, name):
     if int(a) != int(b):
@@ -83,38 +279,46 @@ def sint(signal):
     return signal.value.signed_integer
 
 
-@cocotb.coroutine
-def ClockDomainAsyncReset(clk,reset,period = 1000):
+async def ClockDomainAsyncReset(clk,reset,period = 1000):
     if reset:
         reset <= 1
     clk <= 0
-    yield Timer(period)
+    await Timer(period)
     if reset:
         reset <= 0
     while True:
         clk <= 0
-        yield Timer(period/2)
+        await Timer(period/2)
         clk <= 1
-        yield Timer(period/2)
+        await Timer(period/2)
 
-@cocotb.coroutine
-def SimulationTimeout(duration):
-    yield Timer(duration)
+async def SimulationTimeout(duration):
+    await Timer(duration)
     raise TestFailure("Simulation timeout")
 
 
 import time
-@cocotb.coroutine
-def simulationSpeedPrinter(clk):
+# Also published into the metrics registry as cycles per wall second and sim time per wall second
+async def simulationSpeedPrinter(clk):
+    metrics = getMetrics()
     counter = 0
+    totalCounter = 0
     lastTime = time.time()
+    lastSimTime = get_sim_time()
     while True:
-        yield RisingEdge(clk)
+        await RisingEdge(clk)
         counter += 1
         thisTime = time.time()
         if thisTime - lastTime >= 1.0:
-            lastTime = thisTime
+            simTime = get_sim_time()
+            elapsed = thisTime - lastTime
+            totalCounter += counter
+            metrics.gauge("cocotblib_sim_cycles_per_second", counter/elapsed)
+            metrics.gauge("cocotblib_sim_time_per_second", (simTime - lastSimTime)/elapsed)
+            metrics.setCounter("cocotblib_sim_cycles", totalCounter)
             print("Sim speed : %f khz" %(counter/1000.0))
+            lastTime = thisTime
+            lastSimTime = simTime
             counter = 0
 
 
@@ -147,8 +351,7 @@ class BoolRandomizer:
 
 MyObject = type('MyObject', (object,), {})
 
-@cocotb.coroutine
-def StreamRandomizer(streamName, onNew,handle, dut, clk):
+async def StreamRandomizer(streamName, onNew,handle, dut, clk):
     validRandomizer = BoolRandomizer()
     valid = getattr(dut, streamName + "_valid")
     ready = getattr(dut, streamName + "_ready")
@@ -156,7 +359,7 @@ def StreamRandomizer(streamName, onNew,handle, dut, clk):
 
     valid <= 0
     while True:
-        yield RisingEdge(clk)
+        await RisingEdge(clk)
         if int(ready) == 1:
             valid <= 0
 
@@ -165,7 +368,7 @@ def StreamRandomizer(streamName, onNew,handle, dut, clk):
                 valid <= 1
                 for e in payloads:
                     randSignal(e)
-                yield Timer(1)
+                await Timer(1)
                 if len(payloads) == 1 and payloads[0]._name == streamName + "_payload":
                     payload = int(payloads[0])
                 else:
@@ -175,20 +378,19 @@ def StreamRandomizer(streamName, onNew,handle, dut, clk):
                 if onNew:
                     onNew(payload,handle)
 
-@cocotb.coroutine
-def FlowRandomizer(streamName, onNew,handle, dut, clk):
+async def FlowRandomizer(streamName, onNew,handle, dut, clk):
     validRandomizer = BoolRandomizer()
     valid = getattr(dut, streamName + "_valid")
     payloads = [a for a in dut if a._name.startswith(streamName + "_payload")]
 
     valid <= 0
     while True:
-        yield RisingEdge(clk)
+        await RisingEdge(clk)
         if validRandomizer.get():
             valid <= 1
             for e in payloads:
                 randSignal(e)
-            yield Timer(1)
+            await Timer(1)
             if len(payloads) == 1 and payloads[0]._name == streamName + "_payload":
                 payload = int(payloads[0])
             else:
@@ -200,8 +402,7 @@ def FlowRandomizer(streamName, onNew,handle, dut, clk):
         else:
             valid <= 0
 
-@cocotb.coroutine
-def StreamReader(streamName, onTransaction, handle, dut, clk):
+async def StreamReader(streamName, onTransaction, handle, dut, clk):
     validRandomizer = BoolRandomizer()
     valid = getattr(dut, streamName + "_valid")
     ready = getattr(dut, streamName + "_ready")
@@ -209,7 +410,7 @@ def StreamReader(streamName, onTransaction, handle, dut, clk):
 
     ready <= 0
     while True:
-        yield RisingEdge(clk)
+        await RisingEdge(clk)
         ready <= validRandomizer.get()
         if int(valid) == 1 and int(ready) == 1:
             if len(payloads) == 1 and payloads[0]._name == streamName + "_payload":
@@ -243,6 +444,8 @@ class Bundle:
                 eName = "hid"
             self.nameToElement[eName] = element
 
+        self.nameToRaw = {eName : rawSignal(element) for eName, element in self.nameToElement.items()}
+
     def __getattr__(self, name):
         if name not in self.nameToElement:
             for e in self.nameToElement:
@@ -250,6 +453,62 @@ class Bundle:
         return self.nameToElement[name]
 
 
+###############################################################################
+# Fixed capacity ring buffer of bundle samples, one column per element
+#
+# Usage :
+#
+#    stream.startMonitoringValid(dut.clk, capacity=4096)
+#    ...
+#    columns = stream.captureValid.drain()  # {"data" : array('Q', [...]), "last" : ...}, oldest first
+#
+# Elements up to 64 bits are stored in array('Q') columns, wider ones in preallocated lists.
+# When full the oldest samples are overwritten and counted into droppedCounter.
+#
+class BundleCapture:
+    def __init__(self, bundle, capacity):
+        self.names = list(bundle.nameToRaw)
+        self.raws = [bundle.nameToRaw[name] for name in self.names]
+        self.capacity = capacity
+        self.columns = [array('Q', [0]) * capacity if len(raw) <= 64 else [0] * capacity for raw in self.raws]
+        self.head = 0
+        self.count = 0
+        self.droppedCounter = 0
+
+    def sample(self):
+        head = self.head
+        for column, raw in zip(self.columns, self.raws):
+            column[head] = raw.read()
+        head += 1
+        self.head = 0 if head == self.capacity else head
+        if self.count == self.capacity:
+            self.droppedCounter += 1
+        else:
+            self.count += 1
+
+    def __len__(self):
+        return self.count
+
+    def clear(self):
+        self.count = 0
+
+    # Return and remove all the samples, as {name : column}
+    def drain(self):
+        tail = self.head - self.count
+        columns = {}
+        for name, column in zip(self.names, self.columns):
+            if tail >= 0:
+                columns[name] = column[tail:self.head]
+            else:
+                columns[name] = column[tail:] + column[:self.head]
+        self.count = 0
+        return columns
+
+    # Return and remove all the samples, as one tuple per sample in the names order
+    def drainRows(self):
+        return list(zip(*self.drain().values()))
+
+
 
 def readIHex(path, callback,context):
     with open(path) as f:
@@ -270,24 +529,51 @@ def readIHex(path, callback,context):
 
 
 
-@coroutine
-def TriggerAndCond(trigger, cond):
+async def TriggerAndCond(trigger, cond):
     while(True):
-        yield trigger
+        await trigger
         if cond:
             break
 
 
-@coroutine
-def waitClockedCond(clk, cond):
+# When the signals used by cond are given, sleep until one of them change instead of checking cond every cycle
+async def waitClockedCond(clk, cond, signals=None):
     while(True):
-        yield RisingEdge(clk)
+        await RisingEdge(clk)
         if cond():
             break
+        if signals:
+            await First(*[Edge(s) for s in signals])
+
+
+
+async def TimerClk(clk, count):
+    await waitCycles(clk, count)
 
 
+###############################################################################
+# Wait primitives which don't wake up the coroutine every cycle
+#
 
-@coroutine
-def TimerClk(clk, count):
-    for i in range(count):
-        yield RisingEdge(clk)
\ No newline at end of file
+# Wait count rising edges with a single trigger
+async def waitCycles(clk, count):
+    if count > 0:
+        await ClockCycles(clk, count)
+
+# Wait for a rising edge where signal == value, sleeping on the signal changes in between
+async def waitClockedValue(clk, signal, value):
+    raw = rawSignal(signal)
+    while True:
+        await RisingEdge(clk)
+        if raw.read() == value:
+            break
+        await Edge(signal)
+
+# Check cond on rising edges, the delay between two checks double from 1 up to maxDelay cycles
+async def waitClockedCondBackoff(clk, cond, maxDelay=64):
+    delay = 1
+    while True:
+        await waitCycles(clk, delay)
+        if cond():
+            break
+        delay = min(delay*2, maxDelay)
\ No newline at end of file
@@ -0,0 +1,17 @@
+import importlib.util
+import os
+import sys
+
+
+# The repository is the cocotblib package itself, make it importable whatever the name of the checkout directory
+def _registerCocotblib():
+    root = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+    existing = sys.modules.get("cocotblib")
+    if existing != None and os.path.dirname(os.path.realpath(existing.__file__)) == root:
+        return
+    spec = importlib.util.spec_from_file_location("cocotblib", os.path.join(root, "__init__.py"), submodule_search_locations=[root])
+    module = importlib.util.module_from_spec(spec)
+    sys.modules["cocotblib"] = module
+    spec.loader.exec_module(module)
+
+_registerCocotblib()
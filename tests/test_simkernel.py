@@ -0,0 +1,181 @@
+import random
+
+import pytest
+
+from cocotblib import SimKernel
+
+
+###############################################################################
+# Smoke tests of the library components against the SimKernel reference DUTs
+#
+# Each test installs its own kernel, the components are imported inside it (they capture the kernel triggers).
+#
+@pytest.fixture
+def kernel():
+    random.seed(42)
+    with SimKernel.installed() as kernel:
+        yield kernel
+
+
+def startClock(kernel, dut):
+    from cocotblib.ClockDomain import ClockDomain, RESET_ACTIVE_LEVEL
+    kernel.fork(ClockDomain(dut.clk, 5, dut.reset, RESET_ACTIVE_LEVEL.HIGH).start())
+
+
+def test_streamFifoTester(kernel):
+    from cocotblib.Phase import PhaseManager, PHASE_DONE
+    from cocotblib.Stream import Stream, StreamFifoTester, Transaction
+
+    def genTransaction():
+        trans = Transaction()
+        trans.a = random.getrandbits(8)
+        trans.b = random.getrandbits(32)
+        return trans
+
+    dut = SimKernel.streamFifoDut({"a" : 8, "b" : 32}, 16)
+    phaseManager = PhaseManager()
+    phaseManager.setWaitTasksEndTime(10000)
+    tester = StreamFifoTester("fifo", phaseManager, Stream(dut, "io_push"), Stream(dut, "io_pop"), genTransaction, 500, dut.clk, dut.reset)
+    tester.createInfrastructure()
+    startClock(kernel, dut)
+    kernel.run(phaseManager.run())
+    assert phaseManager.getPhase() == PHASE_DONE
+    assert tester.scoreboard.matchCounter > 500
+
+
+def test_ahbLite3Master(kernel):
+    from cocotblib.AhbLite3 import AhbLite3Master
+    from cocotblib.ClockDomain import RESET_ACTIVE_LEVEL
+    from cocotblib.misc import Bundle
+    from cocotb.triggers import RisingEdge
+
+    dut = SimKernel.ahbLite3MemoryDut(12, 32)
+    ahb = Bundle(dut, "ahb")
+    ahb.HREADY.setimmediatevalue(1)
+    ahb.HSEL.setimmediatevalue(1)
+    master = AhbLite3Master(ahb, dut.clk, dut.reset, resetActiveLevel=RESET_ACTIVE_LEVEL.HIGH)
+    startClock(kernel, dut)
+    data = bytes(random.getrandbits(8) for i in range(1536))
+
+    async def main():
+        while int(dut.reset) == 1 or kernel.time == 0:
+            await RisingEdge(dut.clk)
+        await master.write(0x10, 0xCAFE, size=1)
+        assert await master.read(0x10, size=1) == 0xCAFE
+        await master.writeBurst(0x200, data) # Split at 0x400
+        assert await master.readBurst(0x200, len(data)) == data
+
+    kernel.run(main())
+
+
+def test_axi4SharedMemoryChecker(kernel):
+    from cocotblib.Axi4 import Axi4Shared, Axi4SharedMemoryChecker
+    from cocotblib.Phase import PhaseManager, PHASE_DONE
+
+    dut = SimKernel.axi4SharedMemoryDut(12, 32, 4)
+    phaseManager = PhaseManager()
+    phaseManager.setWaitTasksEndTime(200000)
+    checker = Axi4SharedMemoryChecker("checker", phaseManager, Axi4Shared(dut, "axi"), 12, dut.clk, dut.reset)
+    checker.nonZeroReadRspCounterTarget = 200
+    startClock(kernel, dut)
+    kernel.run(phaseManager.run())
+    assert phaseManager.getPhase() == PHASE_DONE
+    assert checker.readRspScoreboard.matchCounter != 0 and checker.writeRspScoreboard.matchCounter != 0
+
+
+def test_pauseResume(kernel):
+    from cocotblib.Phase import Infrastructure
+    from cocotb.triggers import RisingEdge
+
+    dut = SimKernel.SimDut()
+    dut.addSignal("clk")
+    dut.addSignal("reset")
+    startClock(kernel, dut)
+    wakeups = {}
+
+    def counter(name):
+        async def stim():
+            while True:
+                await RisingEdge(dut.clk)
+                wakeups[name] = wakeups.get(name, 0) + 1
+        return stim
+
+    top = Infrastructure("top", None)
+    top.fork(counter("top"))
+    kernel.run(until=100)
+    top.resume() # Not paused, no duplicated task
+    kernel.run(until=200)
+    assert wakeups["top"] == 20
+
+    top.pause()
+    child = Infrastructure("child", top) # Created paused, forks delayed to the resume
+    child.fork(counter("child"))
+    kernel.run(until=300)
+    assert wakeups["top"] == 20 and "child" not in wakeups
+
+    top.resume()
+    kernel.run(until=400)
+    assert wakeups["top"] == 30 and wakeups["child"] == 10
+    assert len(top.tasks) == 1 and len(child.tasks) == 1
+
+
+def test_legacyCoroutine(kernel):
+    cocotb = pytest.importorskip("cocotb")
+    from cocotb.result import ReturnValue
+    from cocotb.triggers import Timer
+
+    @cocotb.coroutine
+    def inner(value):
+        yield Timer(10)
+        raise ReturnValue(value + 1)
+
+    @cocotb.coroutine
+    def outer():
+        join = yield inner(41)
+        raise ReturnValue(join.retval)
+
+    task = kernel.fork(outer())
+    kernel.run(until=100)
+    assert task.done() and task.result() == 42
+
+
+def test_retvalCoroutine(kernel):
+    from cocotblib.misc import retvalCoroutine
+    from cocotb.triggers import Timer
+
+    @retvalCoroutine
+    async def inner(value):
+        await Timer(10)
+        return value + 1
+
+    def legacy():
+        thread = inner(1)
+        yield thread
+        assert thread.retval == 2
+        thread = inner(2)
+        kernel.fork(thread)
+        yield Timer(20)
+        assert thread.retval == 3
+
+    async def main():
+        assert await inner(3) == 4
+        await kernel.fork(legacy())
+        return True
+
+    task = kernel.fork(main())
+    kernel.run(until=100)
+    assert task.done() and task.result() == True
+
+
+def test_uninstall():
+    import sys
+    with SimKernel.installed() as kernel:
+        import cocotb
+        from cocotblib import Stream as installedStream
+        assert cocotb.fork == kernel.fork and installedStream.cocotb.fork == kernel.fork
+    assert "cocotblib.Stream" not in sys.modules
+    assert SimKernel.getKernel() == None
+    assert getattr(sys.modules.get("cocotb"), "fork", None) != kernel.fork
+    with SimKernel.installed() as other: # Components can be imported again in a new kernel
+        from cocotblib import Stream
+        assert Stream.cocotb.fork == other.fork